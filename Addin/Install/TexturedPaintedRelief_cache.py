@@ -0,0 +1,180 @@
+#-------------------------------------------------------------------------------
+# Name:         TexturedPaintedRelief_cache.py
+# Purpose:      Persistent cache of rasters created by the NumPy engine.
+#
+# Author:       dm
+# Version:      1.0
+#
+# Created:      18/10/2026
+#
+# Copyright:    (c) dm 2012
+# Licence:      public :)
+#-------------------------------------------------------------------------------
+# standard modules
+import os
+import hashlib
+import zipfile
+import tempfile
+# NumPy
+import numpy
+#-------------------------------------------------------------------------------
+hashes = {}     # input files hashes, see file_hash()
+#-------------------------------------------------------------------------------
+def key(*parts):
+    """
+    Description:
+    Creates cache key (fingerprint).
+
+    Arguments:
+    (any) parts:
+        - values the cached array depends on (must have stable repr())
+
+    Returns:
+    (string) key - SHA-1 hex digest
+    """
+    return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+
+
+def file_hash(sourceFile):
+    """
+    Description:
+    Hashes geodata content - all files sharing the base name (ShapeFile,
+    *.flt + *.hdr, world files, ...) or whole directory (ESRI Grid, TIN).
+    Hashes are remembered for the size and modification time of files.
+
+    Arguments:
+    (path string) sourceFile:
+        - path to geodata
+
+    Returns:
+    (string) hash - SHA-1 hex digest
+    """
+    sourceFile = os.path.abspath(str(sourceFile))
+    if os.path.isdir(sourceFile):
+        files = [os.path.join(root, name) for root, dirs, names in
+                 os.walk(sourceFile) for name in names]
+    else:
+        directory, name = os.path.split(sourceFile)
+        base = os.path.splitext(name)[0].lower()
+        files = [os.path.join(directory, n) for n in os.listdir(directory)
+                 if os.path.splitext(n)[0].lower() == base]
+    files.sort()
+    stamp = tuple((f, os.path.getsize(f), os.path.getmtime(f)) for f in files)
+    if hashes.get(sourceFile, (None,))[0] != stamp:
+        sha = hashlib.sha1()
+        for f in files:
+            sha.update(os.path.relpath(f, os.path.dirname(sourceFile))
+                       .lower().encode("utf-8"))
+            with open(f, "rb") as data:
+                for chunk in iter(lambda: data.read(1024 * 1024), b""):
+                    sha.update(chunk)
+        hashes[sourceFile] = (stamp, sha.hexdigest())
+    return hashes[sourceFile][1]
+
+
+class Cache(object):
+    """
+    Description:
+    Content-addressed cache of arrays kept across runs. Entries are keyed by
+    hash of everything the array depends on (input files content, texture
+    parameters, cellSize, extent, seed), so changed inputs never hit stale
+    entries. Least recently used entries are evicted when the cache is
+    bigger than its disk budget.
+
+    Arguments:
+    (path string) directory:
+        - cache directory, created if it doesn't exist
+
+    (integer) budget:
+        - disk budget in MB
+        - default 2048
+    """
+    def __init__(self, directory, budget=2048):
+        self.directory = os.path.abspath(directory)
+        self.budget = budget * 1024 * 1024
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+
+    def path(self, key):
+        """
+        Returns:
+        (path string) entry - cache entry file
+        """
+        return os.path.join(self.directory, key + ".npz")
+
+    def get(self, key):
+        """
+        Description:
+        Reads cache entry, marks it as recently used. Unreadable (truncated,
+        partially written) entry is deleted and taken as not cached.
+
+        Arguments:
+        (string) key:
+            - key by key()
+
+        Returns:
+        (dictionary) arrays - stored arrays by name, None if not cached
+        """
+        entry = self.path(key)
+        try:
+            with open(entry, "rb") as data:
+                arrays = numpy.load(data)
+                arrays = dict((name, arrays[name]) for name in arrays.files)
+            os.utime(entry, None)
+        except (IOError, OSError):
+            return None
+        except (ValueError, KeyError, zipfile.BadZipfile):
+            try:
+                os.remove(entry)
+            except OSError:
+                pass
+            return None
+        return arrays
+
+    def put(self, key, **arrays):
+        """
+        Description:
+        Stores arrays under the key, evicts least recently used entries.
+
+        Arguments:
+        (string) key:
+            - key by key()
+
+        (numpy arrays) arrays:
+            - arrays to store, passed by name
+        """
+        handle, helperFile = tempfile.mkstemp(".tmp", "tpr", self.directory)
+        try:
+            with os.fdopen(handle, "wb") as data:
+                numpy.savez(data, **arrays)
+            entry = self.path(key)
+            if os.path.exists(entry):
+                os.remove(entry)
+            os.rename(helperFile, entry)
+        except (IOError, OSError):
+            if os.path.exists(helperFile):
+                os.remove(helperFile)
+            return
+        self.evict()
+
+    def evict(self):
+        """
+        Description:
+        Deletes least recently used entries until the cache fits its budget.
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".npz"):
+                entry = os.path.join(self.directory, name)
+                entries.append((os.path.getmtime(entry),
+                                os.path.getsize(entry), entry))
+        entries.sort()
+        total = sum(size for modified, size, entry in entries)
+        for modified, size, entry in entries:
+            if total <= self.budget:
+                break
+            try:
+                os.remove(entry)
+                total -= size
+            except OSError:
+                pass
@@ -0,0 +1,1747 @@
+#-------------------------------------------------------------------------------
+# Name:         TexturedPaintedRelief_engine.py
+# Purpose:      NumPy raster engine for TexturedPaintedRelief tool.
+#
+# Author:       dm
+# Version:      1.0
+#
+# Created:      18/10/2026
+#
+# Copyright:    (c) dm 2012
+# Licence:      public :)
+#-------------------------------------------------------------------------------
+# standard modules
+import os
+import math
+import copy
+import tempfile
+# NumPy
+import numpy
+# TexturedPaintedRelief_io
+import TexturedPaintedRelief_io as tprio
+# arcpy - optional, used to convert TINs and by arcpy processing
+try:
+    import arcpy
+except ImportError:
+    arcpy = None
+#-------------------------------------------------------------------------------
+FLOAT = numpy.float32   # texture, DEM and hillshade rasters data type
+NODATA = -2147483648    # landuse raster NoData value
+BLOCK = 256             # grids are scanned by BLOCK rows windows, sparse
+                        # rasters are kept by BLOCK x BLOCK blocks
+#-------------------------------------------------------------------------------
+class Statistics(object):
+    """
+    Description:
+    Raster statistics - computed by a single raster scan, used instead of
+    GetRasterProperties_management() round-trips.
+
+    Arguments:
+    (raster/numpy array/Grid) raster:
+        - arcpy raster (path), NumPy array (NoData = NaN) or Grid (scanned
+          by BLOCK rows windows)
+    """
+    def __init__(self, raster):
+        if isinstance(raster, (numpy.ndarray, tprio.Grid)):
+            self.minimum = self.maximum = None
+            if isinstance(raster, numpy.ndarray):
+                windows = [raster]
+            else:
+                windows = (raster.read(row, 0, BLOCK, raster.cols) for row
+                           in range(0, raster.rows, BLOCK))
+            for window in windows:
+                data = window[~numpy.isnan(window)]
+                if data.size:
+                    minimum, maximum = float(data.min()), float(data.max())
+                    if self.minimum is None:
+                        self.minimum, self.maximum = minimum, maximum
+                    self.minimum = min(self.minimum, minimum)
+                    self.maximum = max(self.maximum, maximum)
+        else:
+            raster = arcpy.Raster(raster)
+            self.minimum = raster.minimum
+            self.maximum = raster.maximum
+
+
+class ResampledGrid(tprio.Grid):
+    """
+    Description:
+    Grid resampled to a new cellSize on demand - windows are sampled from
+    the source grid windows when read, extent origin is kept.
+
+    Arguments:
+    (Grid) grid:
+        - source grid (usually lazy, see tprio.open_raster())
+
+    (float) cellSize:
+        - new cellSize
+
+    (string) method:
+        - 'NEAREST' or 'BILINEAR'
+    """
+    def __init__(self, grid, cellSize, method="BILINEAR"):
+        self.source = grid
+        self.method = method
+        self.xMin = grid.xMin
+        self.yMax = grid.yMax
+        self.cellSize = float(cellSize)
+        self.size = (max(int(round(grid.rows * grid.cellSize / cellSize)), 1),
+                     max(int(round(grid.cols * grid.cellSize / cellSize)), 1))
+
+    @property
+    def shape(self):
+        return self.size
+
+    @property
+    def array(self):
+        return self.read(0, 0, self.rows, self.cols)
+
+    def read_window(self, r0, r1, c0, c1):
+        """
+        Description:
+        Samples cells [r0:r1, c0:c1] from the source grid.
+        """
+        return sample(self.source, self.xMin + c0 * self.cellSize,
+                      self.yMax - r0 * self.cellSize, self.cellSize, r1 - r0,
+                      c1 - c0, self.method)
+
+
+class VectorGrid(tprio.Grid):
+    """
+    Description:
+    ShapeFile rasterized on demand - windows are rasterized from the
+    geometry when read (cells inside are 1, NoData cells are NaN), no
+    intermediate files are created. Polygons cover cells with centers
+    inside, lines cover cells they cross or cells with centers within
+    buffer distance (ROUND ends), points cover their cells or cells within
+    buffer distance. Grid covers the ShapeFile extent (+ buffer) snapped to
+    the reference grid.
+
+    Arguments:
+    (tuple) shapes:
+        - (shapeType, records, extent) by tprio.read_shapefile()
+
+    (float) xRef, yRef, cellSize:
+        - reference grid - any cell corner and cellSize
+
+    (float) buffer:
+        - buffer distance of lines and points in map units
+        - default 0 - no buffer
+    """
+    def __init__(self, shapes, xRef, yRef, cellSize, buffer=0):
+        self.shapeType, self.records, extent = shapes
+        self.buffer = float(buffer)
+        self.cellSize = float(cellSize)
+        xMin, yMin, xMax, yMax = extent
+        if self.shapeType != "Polygon":
+            xMin, yMin = xMin - self.buffer, yMin - self.buffer
+            xMax, yMax = xMax + self.buffer, yMax + self.buffer
+        left = math.floor((xMin - xRef) / self.cellSize)
+        top = math.floor((yRef - yMax) / self.cellSize)
+        self.xMin = xRef + left * self.cellSize
+        self.yMax = yRef - top * self.cellSize
+        self.size = (int(math.floor((yRef - yMin) / self.cellSize)) + 1 -
+                     int(top), int(math.floor((xMax - xRef) /
+                     self.cellSize)) + 1 - int(left))
+        # features extents - (xMin, yMin, xMax, yMax) rows
+        self.extents = numpy.array([[min(p[:, 0].min() for p in r),
+                                     min(p[:, 1].min() for p in r),
+                                     max(p[:, 0].max() for p in r),
+                                     max(p[:, 1].max() for p in r)]
+                                    for r in self.records]).reshape(-1, 4)
+
+    @property
+    def shape(self):
+        return self.size
+
+    @property
+    def array(self):
+        return self.read(0, 0, self.rows, self.cols)
+
+    def read_window(self, r0, r1, c0, c1):
+        """
+        Description:
+        Rasterizes cells [r0:r1, c0:c1] - just features reaching the window
+        are rasterized.
+        """
+        xMin = self.xMin + c0 * self.cellSize
+        yMax = self.yMax - r0 * self.cellSize
+        xMax = self.xMin + c1 * self.cellSize
+        yMin = self.yMax - r1 * self.cellSize
+        reach = self.buffer + self.cellSize
+        near = numpy.nonzero((self.extents[:, 0] <= xMax + reach) &
+                             (self.extents[:, 2] >= xMin - reach) &
+                             (self.extents[:, 1] <= yMax + reach) &
+                             (self.extents[:, 3] >= yMin - reach))[0]
+        records = [self.records[i] for i in near]
+        # cells are located from the grid origin, so windows join exactly
+        if self.shapeType == "Polygon":
+            mask = rasterize_polygons(records, self.xMin, self.yMax,
+                                      self.cellSize, r1 - r0, c1 - c0, r0, c0)
+        else:
+            mask = rasterize_lines(records, self.xMin, self.yMax,
+                                   self.cellSize, r1 - r0, c1 - c0,
+                                   self.buffer, r0, c0)
+        return numpy.where(mask, FLOAT(1), FLOAT(numpy.nan))
+
+
+class SparseRaster(object):
+    """
+    Description:
+    Raster kept by BLOCK x BLOCK blocks of the window grid - just blocks
+    with data are stored (stacked in one array), so rasters which are NoData
+    almost everywhere (textures of small areas) take little memory and are
+    mosaicked without touching empty blocks.
+
+    Arguments:
+    (tuple) shape:
+        - (rows, cols) of the raster
+
+    (numpy arrays) index, blocks:
+        - optional arguments - stored blocks, see SparseRaster.pack()
+        - default None - empty raster
+    """
+    def __init__(self, shape, index=None, blocks=None):
+        self.shape = tuple(int(n) for n in shape)
+        if index is None:
+            index = numpy.empty((0, 2), int)
+            blocks = numpy.empty((0, BLOCK, BLOCK), FLOAT)
+        self.index = index      # (block row, block col) of stored blocks
+        self.blocks = blocks    # stored blocks, out of raster cells are NaN
+
+    @property
+    def nbytes(self):
+        return self.blocks.nbytes
+
+    @property
+    def array(self):
+        array = numpy.empty(self.shape, FLOAT)
+        array.fill(numpy.nan)
+        for target, block in self.windows():
+            array[target] = block
+        return array
+
+    def windows(self):
+        """
+        Description:
+        Iterates stored blocks.
+
+        Returns:
+        (generator) (target, block) - slices of the block in the raster and
+            the block (cropped by the raster)
+        """
+        rows, cols = self.shape
+        for (blockRow, blockCol), block in zip(self.index, self.blocks):
+            r0, c0 = blockRow * BLOCK, blockCol * BLOCK
+            r1, c1 = min(r0 + BLOCK, rows), min(c0 + BLOCK, cols)
+            yield (slice(r0, r1), slice(c0, c1)), block[:r1 - r0, :c1 - c0]
+
+    def insert(self, array, row=0, col=0):
+        """
+        Description:
+        Writes array to the raster, blocks with no data are not stored.
+
+        Arguments:
+        (numpy array) array:
+            - written values, NoData cells are NaN
+
+        (integer) row, col:
+            - array position in the raster
+            - default 0, 0
+        """
+        rows, cols = array.shape
+        stored = dict((tuple(key), i) for i, key in enumerate(self.index))
+        index, blocks = list(map(tuple, self.index)), list(self.blocks)
+        for blockRow in range(row // BLOCK, (row + rows - 1) // BLOCK + 1):
+            for blockCol in range(col // BLOCK, (col + cols - 1) // BLOCK + 1):
+                # intersection of the block and the array
+                r0 = max(blockRow * BLOCK, row)
+                r1 = min((blockRow + 1) * BLOCK, row + rows)
+                c0 = max(blockCol * BLOCK, col)
+                c1 = min((blockCol + 1) * BLOCK, col + cols)
+                values = array[r0 - row:r1 - row, c0 - col:c1 - col]
+                data = ~numpy.isnan(values)
+                if not data.any():
+                    continue
+                if (blockRow, blockCol) not in stored:
+                    block = numpy.empty((BLOCK, BLOCK), FLOAT)
+                    block.fill(numpy.nan)
+                    stored[(blockRow, blockCol)] = len(blocks)
+                    index.append((blockRow, blockCol))
+                    blocks.append(block)
+                block = blocks[stored[(blockRow, blockCol)]]
+                view = block[r0 - blockRow * BLOCK:r1 - blockRow * BLOCK,
+                             c0 - blockCol * BLOCK:c1 - blockCol * BLOCK]
+                view[data] = values[data]
+        if len(index) > len(self.index):
+            self.index = numpy.array(index, int).reshape(-1, 2)
+            self.blocks = numpy.array(blocks, FLOAT).reshape(-1, BLOCK,
+                                                             BLOCK)
+
+    def pack(self):
+        """
+        Description:
+        Gets raster as arrays (for the persistent cache), see unpack().
+
+        Returns:
+        (dictionary) arrays - 'shape', 'index' and 'blocks' arrays
+        """
+        return {"shape": numpy.array(self.shape), "index": self.index,
+                "blocks": self.blocks}
+
+
+class Engine(object):
+    """
+    Description:
+    NumPy raster engine - in-memory counterpart of the arcpy geoprocessing
+    used by Texture.create_array(), Dem and Processor when Processor runs
+    with engine="NumPy". All rasters are NumPy arrays on one processing grid
+    (set by Engine.set_reference()), NoData cells are NaN.
+    Engine.window() creates engine for a part (tile) of the processing grid;
+    points distribution and random rasters are the same in any window.
+
+    Arguments:
+    (float) cellSize:
+        - processing cellSize
+
+    (integer) seed:
+        - random generator seed
+        - default None (random output)
+    """
+    def __init__(self, cellSize, seed=None):
+        self.cellSize = float(cellSize)
+        if seed is None:
+            seed = numpy.random.randint(0, 2 ** 31 - 1)
+        self.seed = seed
+        self.rasters = {}       # read rasters cache, shared by windows
+        self.extents = {}       # areas data extents cache, shared by windows
+        self.lattices = {}      # lattice points by (randomness, density),
+                                # own for each window
+        # processing grid; will be set by Engine.set_reference()
+        self.xMin = None
+        self.yMax = None
+        self.rows = 0
+        self.cols = 0
+        # window position in the processing grid; set by Engine.window()
+        self.rowOffset = 0
+        self.colOffset = 0
+        # processing grid upper left corner, shared by windows
+        self.xOrigin = None
+        self.yOrigin = None
+        # spill directory and size (bytes); set by Processor (memory
+        # workspace), None means arrays are never spilled to disk
+        self.spillDir = None
+        self.spillSize = None
+        # persistent cache (TexturedPaintedRelief_cache.Cache); set by
+        # Processor, None means no caching
+        self.cache = None
+
+    def __getstate__(self):
+        """
+        Description:
+        Worker processes get the engine without rasters read whole (ESRI
+        ASCII Grid areas), workers open them again. Memory-mapped and
+        vector areas are pickled as references only.
+        """
+        state = self.__dict__.copy()
+        state["rasters"] = dict((key, grid) for key, grid in
+                                self.rasters.items() if type(grid) !=
+                                tprio.Grid)
+        return state
+
+    @property
+    def shape(self):
+        return (self.rows, self.cols)
+
+    @property
+    def extent(self):
+        """
+        Returns:
+        (tuple) extent - (xMin, yMin, xMax, yMax)
+        """
+        return (self.xMin, self.yMax - self.rows * self.cellSize,
+                self.xMin + self.cols * self.cellSize, self.yMax)
+
+    def set_reference(self, grid):
+        """
+        Description:
+        Sets processing grid (extent) - arcpy.env.extent counterpart.
+
+        Arguments:
+        (Grid) grid:
+            - grid with processing cellSize, usually DEM
+        """
+        self.set_grid(grid.xMin, grid.yMax, grid.rows, grid.cols)
+
+    def set_grid(self, xMin, yMax, rows, cols):
+        """
+        Description:
+        Sets processing grid by its upper left corner and size.
+
+        Arguments:
+        (float) xMin, yMax:
+            - upper left corner in map units
+
+        (integer) rows, cols:
+            - grid size in cells
+        """
+        self.xMin = self.xOrigin = float(xMin)
+        self.yMax = self.yOrigin = float(yMax)
+        self.rows = rows
+        self.cols = cols
+        self.rowOffset = 0
+        self.colOffset = 0
+
+    def set_extent(self, xMin, yMin, xMax, yMax):
+        """
+        Description:
+        Sets processing grid by extent (e.g. arcpy.env.extent) - used by
+        arcpy processing to exchange rasters with the engine.
+
+        Arguments:
+        (float) xMin, yMin, xMax, yMax:
+            - extent in map units
+        """
+        self.set_grid(xMin, yMax, int(round((yMax - yMin) / self.cellSize)),
+                      int(round((xMax - xMin) / self.cellSize)))
+
+    def read_array(self, raster):
+        """
+        Description:
+        Reads arcpy raster to array on the processing grid.
+
+        Arguments:
+        (raster) raster:
+            - arcpy raster or path to the raster
+
+        Returns:
+        (numpy array) array - float32, NoData cells are NaN
+        """
+        lowerLeft = arcpy.Point(*self.extent[:2])
+        array = arcpy.RasterToNumPyArray(arcpy.sa.Float(raster), lowerLeft,
+                self.cols, self.rows, numpy.nan)
+        return array.astype(FLOAT)
+
+    def to_raster(self, array, nodata=numpy.nan):
+        """
+        Description:
+        Converts array on the processing grid to arcpy raster.
+
+        Arguments:
+        (numpy array) array:
+            - array of the engine shape
+
+        (number) nodata:
+            - array NoData value
+            - default NaN
+
+        Returns:
+        (raster) raster
+        """
+        lowerLeft = arcpy.Point(*self.extent[:2])
+        return arcpy.NumPyArrayToRaster(array, lowerLeft, self.cellSize,
+                                        self.cellSize, nodata)
+
+    def window(self, row, col, rows, cols):
+        """
+        Description:
+        Creates engine for a window (tile) of this engine grid.
+
+        Arguments:
+        (integer) row, col:
+            - window upper left cell
+
+        (integer) rows, cols:
+            - window size in cells
+
+        Returns:
+        (Engine) window
+        """
+        window = copy.copy(self)
+        window.rasters = self.rasters
+        window.xMin = self.xMin + col * self.cellSize
+        window.yMax = self.yMax - row * self.cellSize
+        window.rows = rows
+        window.cols = cols
+        window.rowOffset = self.rowOffset + row
+        window.colOffset = self.colOffset + col
+        window.lattices = {}
+        return window
+
+    def rescale(self, cellSize, margin=1, align=1):
+        """
+        Description:
+        Creates engine of another cellSize covering this window. Its grid has
+        the processing grid origin, so windows of different tiles share cells
+        (random values, points, ...).
+
+        Arguments:
+        (float) cellSize:
+            - cellSize of the new engine
+
+        (integer) margin:
+            - cells added around the window
+            - default 1
+
+        (integer) align:
+            - window is aligned to align x align cells blocks of the grid
+            - default 1
+
+        Returns:
+        (Engine) engine
+        """
+        cellSize = float(cellSize)
+        top = self.yOrigin - self.yMax
+        left = self.xMin - self.xOrigin
+        row0 = int(math.floor(top / cellSize)) - margin
+        col0 = int(math.floor(left / cellSize)) - margin
+        row1 = int(math.ceil((top + self.rows * self.cellSize) /
+                             cellSize)) + margin
+        col1 = int(math.ceil((left + self.cols * self.cellSize) /
+                             cellSize)) + margin
+        row0, col0 = row0 // align * align, col0 // align * align
+        row1, col1 = -(-row1 // align) * align, -(-col1 // align) * align
+        engine = copy.copy(self)
+        engine.rasters = self.rasters
+        engine.cellSize = cellSize
+        engine.xMin = self.xOrigin + col0 * cellSize
+        engine.yMax = self.yOrigin - row0 * cellSize
+        engine.rows = row1 - row0
+        engine.cols = col1 - col0
+        engine.rowOffset = row0
+        engine.colOffset = col0
+        engine.lattices = {}
+        return engine
+
+    def clip(self, extent, margin=0):
+        """
+        Description:
+        Creates engine for a window covering extent (+ margin) - cells of
+        this engine grid the extent reaches.
+
+        Arguments:
+        (tuple) extent:
+            - (xMin, yMin, xMax, yMax) in map units
+
+        (float) margin:
+            - extent buffer in map units
+            - default 0
+
+        Returns:
+        (Engine) window - None if extent is out of this engine grid
+        """
+        xMin, yMin, xMax, yMax = extent
+        row0 = max(int(math.floor((self.yMax - yMax - margin) /
+                                  self.cellSize)), 0)
+        row1 = min(int(math.ceil((self.yMax - yMin + margin) /
+                                 self.cellSize)), self.rows)
+        col0 = max(int(math.floor((xMin - margin - self.xMin) /
+                                  self.cellSize)), 0)
+        col1 = min(int(math.ceil((xMax + margin - self.xMin) /
+                                 self.cellSize)), self.cols)
+        if row0 >= row1 or col0 >= col1:
+            return None
+        return self.window(row0, col0, row1 - row0, col1 - col0)
+
+    def tiles(self, tileSize, halo):
+        """
+        Description:
+        Splits the grid to tiles with overlapping halo.
+
+        Arguments:
+        (integer) tileSize:
+            - tile side in cells
+
+        (integer) halo:
+            - overlap in cells
+
+        Returns:
+        (list of tuples) tiles - (window, core, target) where
+            - window = (row, col, rows, cols) of the tile including halo
+            - core = slices of the tile without halo within the window
+            - target = slices of the tile without halo within the grid
+        """
+        tiles = []
+        for row in range(0, self.rows, tileSize):
+            for col in range(0, self.cols, tileSize):
+                rows = min(tileSize, self.rows - row)
+                cols = min(tileSize, self.cols - col)
+                top = max(row - halo, 0)
+                left = max(col - halo, 0)
+                bottom = min(row + rows + halo, self.rows)
+                right = min(col + cols + halo, self.cols)
+                window = (top, left, bottom - top, right - left)
+                core = (slice(row - top, row - top + rows),
+                        slice(col - left, col - left + cols))
+                target = (slice(row, row + rows), slice(col, col + cols))
+                tiles.append((window, core, target))
+        return tiles
+
+    def store(self, array):
+        """
+        Description:
+        Keeps array for later processing steps - arrays bigger than
+        self.spillSize are moved to a file backed memmap in self.spillDir
+        (created when needed), others stay in memory.
+
+        Arguments:
+        (numpy array/SparseRaster) array:
+            - array to keep, blocks of SparseRaster are spilled at once
+
+        Returns:
+        (numpy array/SparseRaster) array - original array or its memmap copy
+        """
+        if self.spillDir is None or array.nbytes <= self.spillSize:
+            return array
+        if isinstance(array, SparseRaster):
+            array.blocks = self.store(array.blocks)
+            return array
+        if not os.path.exists(self.spillDir):
+            os.makedirs(self.spillDir)
+        handle, fileName = tempfile.mkstemp(".dat", "spl", self.spillDir)
+        os.close(handle)
+        spilled = numpy.memmap(fileName, array.dtype, "w+", shape=array.shape)
+        spilled[:] = array
+        spilled.flush()
+        return spilled
+
+    def constant(self, value):
+        """
+        Description:
+        Creates constant raster on the processing grid.
+
+        Returns:
+        (numpy array) constant
+        """
+        constant = numpy.empty(self.shape, FLOAT)
+        constant.fill(value)
+        return constant
+
+    def cell_hashes(self, stream=0, region=None):
+        """
+        Description:
+        Counter-based (stateless) random generator - each cell gets 64 random
+        bits hashed from (seed, stream, row, column) of the processing grid.
+        No generator state is kept, so values don't depend on the window, on
+        the order windows are generated in or on the number of workers.
+
+        Arguments:
+        (integer or tuple of integers) stream:
+            - random stream number, different streams give different values
+
+        (tuple) region:
+            - (top, left, rows, cols) of the generated raster in the grid
+            - default None - this engine window
+
+        Returns:
+        (numpy array) hashes - uint64
+        """
+        if region is None:
+            region = (self.rowOffset, self.colOffset, self.rows, self.cols)
+        top, left, rows, cols = region
+        keys = mix(numpy.hstack((self.seed, stream)).astype(numpy.uint64))
+        key = keys[:1]
+        for streamKey in keys[1:]:
+            key = mix(key ^ streamKey)
+        rowKeys = mix(key + numpy.arange(top, top + rows)[:, None]
+                      .astype(numpy.uint64))
+        return mix(rowKeys ^ numpy.arange(left, left + cols)[None, :]
+                   .astype(numpy.uint64))
+
+    def uniform(self, stream=0, region=None):
+        """
+        Description:
+        Creates uniformly distributed random raster.
+
+        Arguments:
+        (integer) stream, (tuple) region:
+            - see Engine.cell_hashes()
+
+        Returns:
+        (numpy array) uniform - float64 values from <0, 1)
+        """
+        hashes = self.cell_hashes(stream, region)
+        return (hashes >> numpy.uint64(11)) * 2.0 ** -53
+
+    def normal_raster(self, stream=0, region=None):
+        """
+        Description:
+        arcpy.sa.CreateNormalRaster() counterpart - Box-Muller transform of
+        two 32 bit uniform values taken from each cell hash.
+
+        Arguments:
+        (integer) stream, (tuple) region:
+            - see Engine.cell_hashes()
+
+        Returns:
+        (numpy array) normal - normally distributed values (mean 0, sd 1)
+        """
+        hashes = self.cell_hashes(stream, region)
+        u1 = ((hashes >> numpy.uint64(32)) + 0.5) * 2.0 ** -32
+        u2 = ((hashes & numpy.uint64(0xFFFFFFFF)) + 0.5) * 2.0 ** -32
+        normal = numpy.sqrt(-2 * numpy.log(u1)) * numpy.cos(2 * math.pi * u2)
+        return normal.astype(FLOAT)
+
+    def random_integers(self, minimum, maximum, stream=1):
+        """
+        Description:
+        CreateRandomRaster_management("INTEGER min max") counterpart.
+
+        Arguments:
+        (integer) minimum, maximum:
+            - values range
+
+        (integer) stream:
+            - random stream number, see Engine.cell_hashes()
+
+        Returns:
+        (numpy array) random - integers from <minimum, maximum>
+        """
+        values = maximum - minimum + 1
+        random = numpy.floor(self.uniform(stream) * values) + minimum
+        return random.astype(FLOAT)
+
+    def procedural_noise(self, noiseType, wavelength, octaves=1, stream=1):
+        """
+        Description:
+        Creates smooth (coherent) noise raster - value or Perlin (gradient)
+        noise on a lattice of 'wavelength' spacing, octaves are summed as
+        fractional Brownian motion (each octave has double frequency and half
+        amplitude). Lattice nodes values are hashed from the node position
+        (Engine.cell_hashes()), so noise is the same in any window and doesn't
+        depend on cell size.
+
+        Arguments:
+        (string) noiseType:
+            - 'Value' or 'Perlin'
+
+        (float) wavelength:
+            - lattice spacing (features size) in map units
+
+        (integer) octaves:
+            - number of summed octaves, 1 - no fBm
+            - default 1
+
+        (integer) stream:
+            - random stream number, see Engine.cell_hashes()
+
+        Returns:
+        (numpy array) noise - values from <0, 1>
+        """
+        noise = numpy.zeros(self.shape)
+        amplitudes = 0.0
+        for octave in range(max(int(octaves), 1)):
+            scale = self.cellSize * 2 ** octave / float(wavelength)
+            # cell centers in lattice units, lattice cells and fractions
+            y = (self.rowOffset + numpy.arange(self.rows) + 0.5) * scale
+            x = (self.colOffset + numpy.arange(self.cols) + 0.5) * scale
+            y0, x0 = numpy.floor(y).astype(int), numpy.floor(x).astype(int)
+            fy, fx = (y - y0)[:, None], (x - x0)[None, :]
+            top, left = y0.min(), x0.min()
+            i, j = (y0 - top)[:, None], (x0 - left)[None, :]
+            region = (top, left, y0.max() - top + 2, x0.max() - left + 2)
+            if noiseType == "Perlin":
+                # unit gradients, corners contributions are dot products
+                angle = self.uniform((stream, octave), region) * 2 * math.pi
+                gy, gx = numpy.sin(angle), numpy.cos(angle)
+                corners = [gy[i + dy, j + dx] * (fy - dy) +
+                           gx[i + dy, j + dx] * (fx - dx)
+                           for dy in (0, 1) for dx in (0, 1)]
+            else:
+                values = self.uniform((stream, octave), region)
+                corners = [values[i + dy, j + dx] for dy in (0, 1)
+                           for dx in (0, 1)]
+            u, v = fade(fx), fade(fy)
+            upper = corners[0] + u * (corners[1] - corners[0])
+            lower = corners[2] + u * (corners[3] - corners[2])
+            layer = upper + v * (lower - upper)
+            if noiseType == "Perlin":
+                # 2D Perlin noise range is <-sqrt(0.5), sqrt(0.5)>
+                layer = 0.5 + layer * math.sqrt(0.5)
+            noise += layer * 0.5 ** octave
+            amplitudes += 0.5 ** octave
+        return numpy.clip(noise / amplitudes, 0, 1).astype(FLOAT)
+
+    def lattice_points(self, randomness, density):
+        """
+        Description:
+        Creates points distribution - jittered lattice. Lattice nodes are
+        'density' map units apart, each node is shifted by normally distributed
+        offset with 'randomness' cells standard deviation (clipped to 4 standard
+        deviations). Offsets are seeded by the node position, so points are the
+        same in any window. Only nodes which can reach the window are
+        generated, so the cost depends on number of points, not cells.
+        Points are computed once for each (randomness, density) pair, textures
+        with the same distribution share them.
+
+        Arguments:
+        (integer) randomness:
+            - 0 - regular, 1 - random, 10 - very random, ...
+
+        (integer) density:
+            - lattice spacing in map units
+
+        Returns:
+        (tuple) (rows, cols) - points cell indices within the window
+        """
+        key = (randomness, density, self.cellSize, self.rowOffset,
+               self.colOffset, self.shape)
+        if key not in self.lattices:
+            self.lattices[key] = self.jittered_lattice(randomness, density)
+        return self.lattices[key]
+
+    def jittered_lattice(self, randomness, density):
+        """
+        Description:
+        Generates points of Engine.lattice_points().
+
+        Arguments:
+        (integer) randomness, density:
+            - see Engine.lattice_points()
+
+        Returns:
+        (tuple) (rows, cols) - points cell indices within the window
+        """
+        spacing = max(float(density) / self.cellSize, 1.0)
+        reach = 4 * randomness
+        # lattice nodes range
+        top = int(math.floor((self.rowOffset - reach) / spacing))
+        left = int(math.floor((self.colOffset - reach) / spacing))
+        bottom = int(math.ceil((self.rowOffset + self.rows + reach) / spacing))
+        right = int(math.ceil((self.colOffset + self.cols + reach) / spacing))
+        region = (top, left, bottom - top + 1, right - left + 1)
+        # nodes positions and offsets
+        nodeRows = numpy.arange(top, bottom + 1)[:, None] * spacing
+        nodeCols = numpy.arange(left, right + 1)[None, :] * spacing
+        offsets = []
+        for stream in [-1, -2]:
+            offset = self.normal_raster(stream, region)
+            offsets.append(numpy.clip(offset, -4, 4) * randomness)
+        rows = numpy.round(nodeRows + offsets[0]).astype(int) - self.rowOffset
+        cols = numpy.round(nodeCols + offsets[1]).astype(int) - self.colOffset
+        inside = (rows >= 0) & (rows < self.rows) & \
+                 (cols >= 0) & (cols < self.cols)
+        return rows[inside], cols[inside]
+
+    def resample(self, grid, cellSize, method="BILINEAR"):
+        """
+        Description:
+        Resamples grid to a new cellSize, extent origin is kept. Cells are
+        sampled when windows are read (see ResampledGrid).
+
+        Arguments:
+        (Grid) grid:
+            - grid to resample
+
+        (float) cellSize:
+            - new cellSize
+
+        (string) method:
+            - 'NEAREST' or 'BILINEAR'
+
+        Returns:
+        (ResampledGrid) resampled
+        """
+        return ResampledGrid(grid, cellSize, method)
+
+    def align(self, grid, method="NEAREST"):
+        """
+        Description:
+        Samples grid to the processing grid - arcpy.env.extent and
+        arcpy.env.cellSize counterpart.
+
+        Returns:
+        (numpy array) aligned - cells outside of grid are NaN
+        """
+        return sample(grid, self.xMin, self.yMax, self.cellSize, self.rows,
+                      self.cols, method)
+
+    def read_terrain(self, sourceFile, terrainType):
+        """
+        Description:
+        Opens terrain (DEM) in processing cellSize for windowed reads. TINs
+        are converted by arcpy (TinRaster_3d), rasters are memory-mapped
+        where possible (see tprio.open_raster()) and resampled (bilinear)
+        on demand if needed.
+
+        Arguments:
+        (path string) sourceFile:
+            - path to the terrain
+
+        (string) terrainType:
+            - 'Tin' or 'RasterDataset'
+
+        Returns:
+        (Grid) dem - lazy grid, see Grid.read()
+        """
+        if terrainType == "Tin":
+            if arcpy is None:
+                raise IOError("TIN terrain can't be read without arcpy.")
+            sourceFile = arcpy.TinRaster_3d(sourceFile, "dem", "FLOAT",
+                         "LINEAR", "CELLSIZE {0}".format(self.cellSize))
+        grid = tprio.open_raster(str(sourceFile))
+        if grid.cellSize != self.cellSize:
+            grid = self.resample(grid, self.cellSize)
+        return grid
+
+    def data_extent(self, sourceFile, dataType):
+        """
+        Description:
+        Gets extent of area of interest data - bounding box of ShapeFile
+        features or of raster cells with data (raster is scanned by BLOCK
+        rows windows once, windows reuse it).
+
+        Arguments:
+        (path string) sourceFile:
+            - path to geodata
+
+        (string) dataType:
+            - 'ShapeFile' or 'RasterDataset'
+
+        Returns:
+        (tuple) extent - (xMin, yMin, xMax, yMax), None if there is no data
+        """
+        key = str(sourceFile)
+        if key not in self.extents:
+            grid = self.read_grid(sourceFile, dataType)
+            extent = None
+            if isinstance(grid, VectorGrid):
+                if len(grid.extents):
+                    extent = tuple(grid.extents[:, :2].min(0)) + \
+                             tuple(grid.extents[:, 2:].max(0))
+            else:
+                rows = []
+                cols = numpy.zeros(grid.cols, bool)
+                for row in range(0, grid.rows, BLOCK):
+                    data = ~numpy.isnan(grid.read(row, 0, BLOCK, grid.cols))
+                    rows.extend(row + numpy.nonzero(data.any(1))[0])
+                    cols |= data.any(0)
+                if rows:
+                    cols = numpy.nonzero(cols)[0]
+                    extent = (grid.xMin + cols[0] * grid.cellSize,
+                              grid.yMax - (rows[-1] + 1) * grid.cellSize,
+                              grid.xMin + (cols[-1] + 1) * grid.cellSize,
+                              grid.yMax - rows[0] * grid.cellSize)
+            self.extents[key] = extent
+        return self.extents[key]
+
+    def read_grid(self, sourceFile, dataType, buffer=0):
+        """
+        Description:
+        Opens area of interest once, windows reuse it. Rasters are
+        memory-mapped where possible (see tprio.open_raster()), so windows
+        (tiles) read just their cells; ShapeFiles are rasterized natively on
+        the processing grid, window by window (see VectorGrid).
+
+        Arguments:
+        (path string) sourceFile:
+            - path to geodata
+
+        (string) dataType:
+            - 'ShapeFile' or 'RasterDataset'
+
+        (float) buffer:
+            - buffer distance of ShapeFile lines/points in map units
+            - default 0 - no buffer
+
+        Returns:
+        (Grid) grid
+        """
+        key = str(sourceFile)
+        if dataType == "ShapeFile":
+            # rasterized on this engine cellSize
+            key = "{0}|{1}|{2}".format(key, buffer, self.cellSize)
+        if key not in self.rasters:
+            if dataType == "ShapeFile":
+                self.rasters[key] = VectorGrid(tprio.read_shapefile(
+                                    str(sourceFile)), self.xMin, self.yMax,
+                                    self.cellSize, buffer)
+            else:
+                self.rasters[key] = tprio.open_raster(str(sourceFile))
+        return self.rasters[key]
+
+    def mask_at(self, sourceFile, dataType, rows, cols):
+        """
+        Description:
+        Tests if cells are inside area of interest - reads just the cells,
+        not the whole mask.
+
+        Arguments:
+        (path string) sourceFile, (string) dataType:
+            - see Engine.read_mask()
+
+        (numpy array) rows, cols:
+            - cell indices within the window
+
+        Returns:
+        (numpy array) inside - True for cells inside area of interest
+        """
+        grid = self.read_grid(sourceFile, dataType)
+        # cell centers in source grid cell units
+        x = (self.xMin + (cols + 0.5) * self.cellSize - grid.xMin) / \
+            grid.cellSize
+        y = (grid.yMax - self.yMax + (rows + 0.5) * self.cellSize) / \
+            grid.cellSize
+        c = numpy.floor(x).astype(int)
+        r = numpy.floor(y).astype(int)
+        inside = (r >= 0) & (r < grid.rows) & (c >= 0) & (c < grid.cols)
+        if inside.any():
+            r, c = r[inside], c[inside]
+            # just the window around the cells is read
+            window = grid.read(r.min(), c.min(), r.max() - r.min() + 1,
+                               c.max() - c.min() + 1)
+            inside[inside] = ~numpy.isnan(window[r - r.min(), c - c.min()])
+        return inside
+
+    def read_mask(self, sourceFile, dataType, buffer=0):
+        """
+        Description:
+        Reads area of interest as boolean mask on the processing grid.
+
+        Arguments:
+        (path string) sourceFile:
+            - path to geodata
+
+        (string) dataType:
+            - 'ShapeFile' or 'RasterDataset'
+
+        (float) buffer:
+            - buffer distance of ShapeFile lines/points in map units
+            - default 0 - no buffer
+
+        Returns:
+        (numpy array) mask - True inside area of interest
+        """
+        return ~numpy.isnan(self.align(self.read_grid(sourceFile, dataType,
+                                                      buffer)))
+
+    def distance(self, points, maxDistance):
+        """
+        Description:
+        Euclidean distance to the nearest point - arcpy.sa.EucDistance()
+        counterpart. Exact distance transform in time linear in cells (see
+        distance_transform()), independent of maxDistance.
+
+        Arguments:
+        (numpy array) points:
+            - boolean raster, True cells are sources
+
+        (float) maxDistance:
+            - maximum distance in map units
+
+        Returns:
+        (numpy array) distance - cells further than maxDistance are NaN
+        """
+        distance = numpy.sqrt(distance_transform(points)) * self.cellSize
+        distance[distance > maxDistance] = numpy.nan
+        return distance.astype(FLOAT)
+
+    def disk_offsets(self, radius):
+        """
+        Description:
+        Gets offsets of cells reached from a point within radius -
+        EucDistance(points, radius) kernel.
+
+        Arguments:
+        (float) radius:
+            - maximum distance in map units
+
+        Returns:
+        (tuple) (dy, dx, distance) - offsets in cells, distance in map units
+        """
+        reach = int(radius / self.cellSize)
+        dy, dx = numpy.mgrid[-reach:reach + 1, -reach:reach + 1]
+        distance = numpy.hypot(dx, dy) * self.cellSize
+        inside = distance <= radius
+        return dy[inside], dx[inside], distance[inside]
+
+    def square_offsets(self, size):
+        """
+        Description:
+        Gets offsets of cells which have a point in size x size cells
+        neighbourhood - FocalStatistics(points, NbrRectangle(size, size))
+        kernel.
+
+        Arguments:
+        (integer) size:
+            - neighbourhood side in cells
+
+        Returns:
+        (tuple) (dy, dx) - offsets in cells
+        """
+        size = max(int(round(size)), 1)
+        before = (size - 1) // 2
+        dy, dx = numpy.mgrid[before - size + 1:before + 1,
+                             before - size + 1:before + 1]
+        return dy.ravel(), dx.ravel()
+
+    def stamp(self, rows, cols, kernel):
+        """
+        Description:
+        Splats kernel at each point, overlapping kernels are composited by
+        maximum. Work is proportional to points x kernel cells.
+
+        Arguments:
+        (numpy arrays) rows, cols:
+            - points cell indices
+
+        (tuple) kernel:
+            - (dy, dx, values) - offsets in cells and kernel values
+
+        Returns:
+        (numpy array) stamped - cells out of all kernels are NaN
+        """
+        stamped = self.constant(numpy.nan)
+        for dy, dx, value in zip(*kernel):
+            r = rows + dy
+            c = cols + dx
+            inside = (r >= 0) & (r < self.rows) & (c >= 0) & (c < self.cols)
+            r = r[inside]
+            c = c[inside]
+            # each point hits distinct cell for given offset
+            stamped[r, c] = numpy.fmax(stamped[r, c], value)
+        return stamped
+
+    def mosaic(self, rasters, zIndices):
+        """
+        Description:
+        Merges rasters - MosaicToNewRaster_management(..., "First")
+        counterpart. The first raster with data wins. Landuse (z-index of
+        the winning raster) is created in the same pass.
+
+        Arguments:
+        (list) rasters:
+            - ordered rasters (numpy arrays or SparseRasters - just their
+              stored blocks are merged), NoData cells are NaN
+
+        (list) zIndices:
+            - z-index of each raster
+
+        Returns:
+        (tuple) (mosaic, landuse) - NoData cells are NaN / NODATA
+        """
+        mosaic = self.constant(numpy.nan)
+        landuse = numpy.empty(self.shape, numpy.int32)
+        landuse.fill(NODATA)
+        empty = numpy.ones(self.shape, bool)
+        for raster, zIndex in zip(rasters, zIndices):
+            if isinstance(raster, SparseRaster):
+                windows = raster.windows()
+            else:
+                windows = [((slice(None), slice(None)), raster)]
+            for target, values in windows:
+                fill = empty[target] & ~numpy.isnan(values)
+                mosaic[target][fill] = values[fill]
+                landuse[target][fill] = zIndex
+                empty[target] &= ~fill
+        return mosaic, landuse
+
+    def surface(self, dem, zfactor):
+        """
+        Description:
+        Computes terrain gradients (Horn's method) once for any number of
+        light sources - cos(slope) and sin(slope) * cos/sin(aspect), derived
+        from the gradients without trigonometric functions.
+
+        Arguments:
+        (numpy array) dem:
+            - terrain
+
+        (float) zfactor:
+            - see Dem
+
+        Returns:
+        (tuple) (flat, east, north) - illumination terms for Engine.shade()
+        """
+        z = numpy.pad(dem, 1, mode="edge")
+        a, b, c = z[:-2, :-2], z[:-2, 1:-1], z[:-2, 2:]
+        d, f = z[1:-1, :-2], z[1:-1, 2:]
+        g, h, i = z[2:, :-2], z[2:, 1:-1], z[2:, 2:]
+        dzdx = ((c + 2 * f + i) - (a + 2 * d + g)) * (zfactor /
+               (8 * self.cellSize))
+        dzdy = ((g + 2 * h + i) - (a + 2 * b + c)) * (zfactor /
+               (8 * self.cellSize))
+        flat = 1 / numpy.sqrt(1 + dzdx ** 2 + dzdy ** 2)
+        return flat, -dzdx * flat, dzdy * flat
+
+    def shade(self, surface, azimuth, altitude):
+        """
+        Description:
+        Shades terrain gradients by one light source - hillshade in percent
+        (0 - 1) computed in one pass.
+
+        Arguments:
+        (tuple) surface:
+            - illumination terms by Engine.surface()
+
+        (integer) azimuth, altitude:
+            - light source, see Dem
+
+        Returns:
+        (numpy array) hsPer - hillshade / 255 (hillshade values are integers)
+        """
+        flat, east, north = surface
+        zenith = math.radians(90.0 - altitude)
+        azimuthMath = math.radians((360.0 - azimuth + 90.0) % 360.0)
+        hillshade = numpy.floor(numpy.clip(255.0 * (math.cos(zenith) * flat +
+                    math.sin(zenith) * (math.cos(azimuthMath) * east +
+                    math.sin(azimuthMath) * north)), 0, 255)).astype(FLOAT)
+        hillshade /= FLOAT(255)
+        return hillshade
+
+    def cast_shadows(self, dem, azimuth, altitude, zfactor):
+        """
+        Description:
+        Cast shadows by sweep-line horizon - the terrain is swept line by line
+        away from the light source, every line keeps the horizon (highest
+        terrain towards the light lowered by the light's slope) and passes it
+        to the next line. Each cell is visited once, so the time is linear.
+        The horizon between cells is interpolated linearly.
+
+        Arguments:
+        (numpy array) dem:
+            - terrain
+
+        (integer) azimuth, altitude, (float) zfactor:
+            - light source and z factor, see Dem
+
+        Returns:
+        (numpy array) shadows - True for cells in cast shadow
+        """
+        if altitude >= 90:
+            return numpy.zeros(dem.shape, bool)
+        # step towards the light in (row, column) cells, rows run southwards
+        toLight = (-math.cos(math.radians(azimuth)),
+                   math.sin(math.radians(azimuth)))
+        z = numpy.where(numpy.isnan(dem), -numpy.inf, dem * float(zfactor))
+        # sweep along columns, otherwise along rows (transposed)
+        transposed = abs(toLight[0]) > abs(toLight[1])
+        if transposed:
+            z, toLight = z.T, toLight[::-1]
+        # light from the start of the lines, otherwise flipped
+        flipped = toLight[1] > 0
+        if flipped:
+            z = z[:, ::-1]
+        lateral = toLight[0] / abs(toLight[1])
+        shift = int(math.floor(lateral))
+        weight = lateral - shift
+        drop = (self.cellSize * math.sqrt(1 + lateral ** 2) *
+                math.tan(math.radians(altitude)))
+        lines = z.shape[0]
+        shadows = numpy.zeros(z.shape, bool)
+        # terrain or horizon of the previous line, 2 cells padding for
+        # shifts to rows outside the raster
+        previous = numpy.empty(lines + 4)
+        previous.fill(-numpy.inf)
+        horizon = numpy.empty(lines)
+        horizon.fill(-numpy.inf)
+        upper = slice(2 + shift, 2 + shift + lines)
+        lower = slice(3 + shift, 3 + shift + lines)
+        for i in range(z.shape[1]):
+            line = z[:, i]
+            shadows[:, i] = horizon > line
+            numpy.fmax(line, horizon, previous[2:-2])
+            # -inf * 0 is NaN - interpolate only where needed
+            if weight == 0:
+                horizon = previous[upper] - drop
+            else:
+                horizon = ((1 - weight) * previous[upper] + weight *
+                           previous[lower]) - drop
+        if flipped:
+            shadows = shadows[:, ::-1]
+        if transposed:
+            shadows = shadows.T
+        return shadows & ~numpy.isnan(dem)
+
+    def hillshade(self, dem, azimuth, altitude, zfactor, shadows=False):
+        """
+        Description:
+        Hillshade - arcpy.sa.Hillshade() / 255.0 counterpart.
+
+        Arguments:
+        (numpy array) dem:
+            - terrain
+
+        (integer) azimuth, altitude, (float) zfactor:
+            - hillshade parameters, see Dem
+
+        (boolean) shadows:
+            - cells in cast shadow (Engine.cast_shadows()) get 0
+
+        Returns:
+        (numpy array) hsPer - hillshade in 0 - 1 range
+        """
+        return self.hillshade_batch(dem, [(azimuth, altitude)], zfactor,
+                                    shadows)[0]
+
+    def hillshade_batch(self, dem, lights, zfactor, shadows=False):
+        """
+        Description:
+        Hillshades for several light sources - gradients are computed once.
+
+        Arguments:
+        (numpy array) dem:
+            - terrain
+
+        (list) lights:
+            - (azimuth, altitude) pairs
+
+        (float) zfactor:
+            - see Dem
+
+        (boolean) shadows:
+            - cells in cast shadow of each light source get 0
+
+        Returns:
+        (list) hsPers - hillshade in 0 - 1 range for each light source
+        """
+        surface = self.surface(dem, zfactor)
+        hsPers = []
+        for azimuth, altitude in lights:
+            hsPer = self.shade(surface, azimuth, altitude)
+            if shadows:
+                hsPer[self.cast_shadows(dem, azimuth, altitude, zfactor)] = 0
+            hsPers.append(hsPer)
+        return hsPers
+
+    def write_rgb(self, outputFile, rgb, compression=None, epsg=None,
+                  geographic=False, wkt=None, overviews=False):
+        """
+        Description:
+        Writes RGB composite - CompositeBands_management() counterpart.
+
+        Arguments:
+        (path string) outputFile:
+            - output image path
+
+        (numpy array) rgb:
+            - RGB composite by composite()
+
+        (string) compression, (boolean) overviews:
+            - TIFF only, see tprio.TiffWriter
+
+        (integer) epsg, (boolean) geographic, (string) wkt:
+            - coordinate system, see tprio.write_rgb()
+        """
+        tprio.write_rgb(outputFile, rgb, self.xMin, self.yMax, self.cellSize,
+                        compression, epsg, geographic, wkt, overviews)
+
+
+def aggregate(array, factor):
+    """
+    Description:
+    Averages array by factor x factor blocks - cells with data in less than
+    half of their block are NaN.
+
+    Arguments:
+    (numpy array) array:
+        - averaged array, NoData cells are NaN
+
+    (integer) factor:
+        - block side in cells
+
+    Returns:
+    (numpy array) aggregated - array of ceil(shape / factor) cells
+    """
+    rows, cols = array.shape
+    padded = numpy.empty((-(-rows // factor) * factor,
+                          -(-cols // factor) * factor), FLOAT)
+    padded.fill(numpy.nan)
+    padded[:rows, :cols] = array
+    blocks = padded.reshape(padded.shape[0] // factor, factor,
+                            padded.shape[1] // factor, factor)
+    data = ~numpy.isnan(blocks)
+    count = data.sum(3).sum(1)
+    total = numpy.where(data, blocks, 0).sum(3).sum(1)
+    aggregated = total / numpy.maximum(count, 1)
+    aggregated[count * 2 < factor * factor] = numpy.nan
+    return aggregated.astype(FLOAT)
+
+
+def resample_texture(array, source, target):
+    """
+    Description:
+    Resamples texture array from source engine grid to target engine grid -
+    bilinear weighted by cells with data (texture edges don't shrink), finer
+    source is averaged by blocks of the target cellSize first (source window
+    should be aligned to the blocks, see Engine.rescale()).
+
+    Arguments:
+    (numpy array) array:
+        - texture array on the source grid
+
+    (Engine) source, target:
+        - source and target grids
+
+    Returns:
+    (numpy array) texture - array on the target grid
+    """
+    cellSize = source.cellSize
+    factor = int(target.cellSize / cellSize + 1e-9)
+    if factor >= 2:
+        array = aggregate(array, factor)
+        cellSize *= factor
+    data = ~numpy.isnan(array)
+    sampled = []
+    for values in (numpy.where(data, array, 0), data):
+        grid = tprio.Grid(values.astype(FLOAT), source.xMin, source.yMax,
+                          cellSize)
+        sampled.append(sample(grid, target.xMin, target.yMax,
+                              target.cellSize, target.rows, target.cols,
+                              "BILINEAR"))
+    values, weights = sampled
+    texture = values / numpy.maximum(weights, 1e-6)
+    texture[~(weights >= 0.5)] = numpy.nan
+    return texture
+
+
+def unpack(arrays):
+    """
+    Description:
+    Creates SparseRaster from arrays by SparseRaster.pack().
+
+    Arguments:
+    (dictionary) arrays:
+        - 'shape', 'index' and 'blocks' arrays
+
+    Returns:
+    (SparseRaster) raster
+    """
+    return SparseRaster(arrays["shape"], arrays["index"], arrays["blocks"])
+
+
+def fade(t):
+    """
+    Description:
+    Perlin fade curve 6t^5 - 15t^4 + 10t^3 - smooth interpolation weights
+    (continuous first and second derivatives at lattice nodes).
+    """
+    return t * t * t * (t * (t * 6 - 15) + 10)
+
+
+def mix(keys):
+    """
+    Description:
+    SplitMix64 finalizer - scrambles 64 bit keys, consecutive keys give
+    unrelated hashes.
+
+    Arguments:
+    (numpy array) keys:
+        - uint64 keys
+
+    Returns:
+    (numpy array) hashes - uint64
+    """
+    keys = keys + numpy.uint64(0x9E3779B97F4A7C15)
+    keys = (keys ^ (keys >> numpy.uint64(30))) * \
+        numpy.uint64(0xBF58476D1CE4E5B9)
+    keys = (keys ^ (keys >> numpy.uint64(27))) * \
+        numpy.uint64(0x94D049BB133111EB)
+    return keys ^ (keys >> numpy.uint64(31))
+
+
+def sample(grid, xMin, yMax, cellSize, rows, cols, method):
+    """
+    Description:
+    Samples grid values at the cell centers of the target grid - just the
+    source window under the target grid is read.
+
+    Arguments:
+    (Grid) grid:
+        - source grid
+
+    (float) xMin, yMax, cellSize, (integer) rows, cols:
+        - target grid
+
+    (string) method:
+        - 'NEAREST' or 'BILINEAR'
+
+    Returns:
+    (numpy array) sampled - cells outside of source grid are NaN
+    """
+    if rows == 0 or cols == 0:
+        return numpy.zeros((rows, cols), FLOAT)
+    # target cell centers in source grid cell units
+    x = (xMin + (numpy.arange(cols) + 0.5) * cellSize - grid.xMin) / \
+        grid.cellSize
+    y = (grid.yMax - yMax + (numpy.arange(rows) + 0.5) * cellSize) / \
+        grid.cellSize
+    if method == "NEAREST":
+        c = numpy.floor(x).astype(int)
+        r = numpy.floor(y).astype(int)
+        cOut = (c < 0) | (c >= grid.cols)
+        rOut = (r < 0) | (r >= grid.rows)
+        r = numpy.clip(r, 0, grid.rows - 1)
+        c = numpy.clip(c, 0, grid.cols - 1)
+        source = grid.read(r.min(), c.min(), r.max() - r.min() + 1,
+                           c.max() - c.min() + 1)
+        sampled = source[(r - r.min())[:, None], (c - c.min())[None, :]]
+        sampled = sampled.astype(FLOAT)
+    else:
+        x = x - 0.5
+        y = y - 0.5
+        cOut = (x < -0.5) | (x > grid.cols - 0.5)
+        rOut = (y < -0.5) | (y > grid.rows - 0.5)
+        x = numpy.clip(x, 0, grid.cols - 1)
+        y = numpy.clip(y, 0, grid.rows - 1)
+        c0 = numpy.minimum(numpy.floor(x).astype(int), grid.cols - 2)
+        r0 = numpy.minimum(numpy.floor(y).astype(int), grid.rows - 2)
+        c0 = numpy.maximum(c0, 0)
+        r0 = numpy.maximum(r0, 0)
+        c1 = numpy.minimum(c0 + 1, grid.cols - 1)
+        r1 = numpy.minimum(r0 + 1, grid.rows - 1)
+        wx = (x - c0)[None, :]
+        wy = (y - r0)[:, None]
+        # source window, indices relative to it
+        row, col = r0.min(), c0.min()
+        source = grid.read(row, col, r1.max() - row + 1, c1.max() - col + 1)
+        r0, r1, c0, c1 = r0 - row, r1 - row, c0 - col, c1 - col
+        top = source[r0[:, None], c0] * (1 - wx) + \
+              source[r0[:, None], c1] * wx
+        bottom = source[r1[:, None], c0] * (1 - wx) + \
+                 source[r1[:, None], c1] * wx
+        sampled = (top * (1 - wy) + bottom * wy).astype(FLOAT)
+    sampled[rOut, :] = numpy.nan
+    sampled[:, cOut] = numpy.nan
+    return sampled
+
+
+def rasterize_polygons(records, xMin, yMax, cellSize, rows, cols,
+                       rowOffset=0, colOffset=0):
+    """
+    Description:
+    Scanline polygon rasterization - cells with centers inside polygons
+    (even-odd rule, so holes are kept) are True. Edge crossings of each
+    scanline toggle cells right of the crossing, running sum of the toggles
+    is odd inside.
+
+    Arguments:
+    (list) records:
+        - polygons - lists of rings, see tprio.read_shapefile()
+
+    (float) xMin, yMax, cellSize, (integer) rows, cols:
+        - target grid
+
+    (integer) rowOffset, colOffset:
+        - target window position within the grid
+        - default 0, 0 - whole grid
+
+    Returns:
+    (numpy array) mask - boolean raster
+    """
+    mask = numpy.zeros((rows, cols), bool)
+    for rings in records:
+        edges = numpy.concatenate([numpy.hstack((ring[:-1], ring[1:])) for
+                                   ring in rings if len(ring) > 1])
+        x0, y0, x1, y1 = edges.T
+        yLow, yHigh = numpy.minimum(y0, y1), numpy.maximum(y0, y1)
+        # scanlines (cell center rows) crossing each edge - yLow <= y < yHigh
+        first = numpy.floor((yMax - yHigh) / cellSize - 0.5).astype(int) + 1
+        last = numpy.floor((yMax - yLow) / cellSize - 0.5).astype(int)
+        first = numpy.maximum(first - rowOffset, 0)
+        last = numpy.minimum(last - rowOffset, rows - 1)
+        counts = numpy.maximum(last - first + 1, 0)
+        if not counts.sum():
+            continue
+        edge = numpy.repeat(numpy.arange(edges.shape[0]), counts)
+        row = (numpy.arange(counts.sum()) -
+               numpy.repeat(numpy.cumsum(counts) - counts, counts) +
+               first[edge])
+        y = yMax - (row + rowOffset + 0.5) * cellSize
+        x = x0[edge] + (y - y0[edge]) * (x1[edge] - x0[edge]) / \
+            (y1[edge] - y0[edge])
+        col = numpy.clip(numpy.ceil((x - xMin) / cellSize - 0.5).astype(int) -
+                         colOffset, 0, cols)
+        top, bottom = row.min(), row.max() + 1
+        toggles = numpy.zeros((bottom - top, cols + 1), numpy.int32)
+        numpy.add.at(toggles, (row - top, col), 1)
+        inside = numpy.cumsum(toggles, 1)[:, :-1] % 2 == 1
+        mask[top:bottom] |= inside
+    return mask
+
+
+def rasterize_lines(records, xMin, yMax, cellSize, rows, cols, buffer=0,
+                    rowOffset=0, colOffset=0):
+    """
+    Description:
+    Line (and point) rasterization. Without buffer cells crossed by lines
+    (containing points) are True, with buffer cells with centers within
+    buffer distance from lines (points) are True.
+
+    Arguments:
+    (list) records:
+        - polylines (lists of paths) or points, see tprio.read_shapefile()
+
+    (float) xMin, yMax, cellSize, (integer) rows, cols:
+        - target grid
+
+    (float) buffer:
+        - buffer distance in map units
+        - default 0 - no buffer
+
+    (integer) rowOffset, colOffset:
+        - target window position within the grid
+        - default 0, 0 - whole grid
+
+    Returns:
+    (numpy array) mask - boolean raster
+    """
+    mask = numpy.zeros((rows, cols), bool)
+    for parts in records:
+        for part in parts:
+            # points are segments of zero length
+            if len(part) == 1:
+                part = numpy.vstack((part, part))
+            for (x0, y0), (x1, y1) in zip(part[:-1], part[1:]):
+                if buffer <= 0:
+                    # samples along the segment, at most half cell apart
+                    length = math.hypot(x1 - x0, y1 - y0)
+                    t = numpy.linspace(0, 1, int(length / cellSize * 2) + 2)
+                    c = numpy.floor((x0 + t * (x1 - x0) - xMin) /
+                                    cellSize).astype(int) - colOffset
+                    r = numpy.floor((yMax - y0 - t * (y1 - y0)) /
+                                    cellSize).astype(int) - rowOffset
+                    inside = (r >= 0) & (r < rows) & (c >= 0) & (c < cols)
+                    mask[r[inside], c[inside]] = True
+                    continue
+                # cells around the segment
+                cMin = max(int(math.floor((min(x0, x1) - buffer - xMin) /
+                           cellSize)) - colOffset, 0)
+                cMax = min(int(math.floor((max(x0, x1) + buffer - xMin) /
+                           cellSize)) + 1 - colOffset, cols)
+                rMin = max(int(math.floor((yMax - max(y0, y1) - buffer) /
+                           cellSize)) - rowOffset, 0)
+                rMax = min(int(math.floor((yMax - min(y0, y1) + buffer) /
+                           cellSize)) + 1 - rowOffset, rows)
+                if cMin >= cMax or rMin >= rMax:
+                    continue
+                x = xMin + (numpy.arange(cMin, cMax) + colOffset + 0.5) * \
+                    cellSize
+                y = yMax - (numpy.arange(rMin, rMax)[:, None] + rowOffset +
+                            0.5) * cellSize
+                # distance from the nearest segment point
+                dx, dy = x1 - x0, y1 - y0
+                squared = dx * dx + dy * dy
+                if squared > 0:
+                    t = numpy.clip(((x - x0) * dx + (y - y0) * dy) / squared,
+                                   0, 1)
+                else:
+                    t = numpy.zeros((y.size, x.size))
+                distance = numpy.hypot(x - x0 - t * dx, y - y0 - t * dy)
+                mask[rMin:rMax, cMin:cMax] |= distance <= buffer
+    return mask
+
+
+def distance_transform(sources):
+    """
+    Description:
+    Squared Euclidean distance transform (Felzenszwalb & Huttenlocher) -
+    1D transforms along columns and then along rows, each in time linear in
+    cells.
+
+    Arguments:
+    (numpy array) sources:
+        - boolean raster, True cells are sources
+
+    Returns:
+    (numpy array) squared - squared distance to the nearest source in cells,
+        inf where there is no source
+    """
+    squared = numpy.where(sources, 0.0, numpy.inf)
+    squared = lower_envelope(squared.T).T
+    return lower_envelope(squared)
+
+
+def lower_envelope(f):
+    """
+    Description:
+    1D squared distance transform of each row - lower envelope of parabolas
+    rooted at the finite cells. Rows are processed at once, the loops run
+    over columns.
+
+    Arguments:
+    (numpy array) f:
+        - sampled function, inf cells root no parabola
+
+    Returns:
+    (numpy array) squared - min over q of (p - q) ** 2 + f[q] for each p
+    """
+    rows, cols = f.shape
+    index = numpy.arange(rows)
+    # envelope parabolas roots (v) and boundaries between them (z)
+    v = numpy.zeros((rows, cols), numpy.intp)
+    z = numpy.empty((rows, cols + 1))
+    z.fill(numpy.inf)
+    k = numpy.empty(rows, numpy.intp)
+    k.fill(-1)
+    def intersection(q, lines):
+        root = v[lines, k[lines]]
+        return ((f[lines, q] + q * q) - (f[lines, root] + root * root)) / \
+               (2.0 * (q - root))
+    for q in range(cols):
+        lines = index[numpy.isfinite(f[:, q])]
+        if not lines.size:
+            continue
+        # pop parabolas hidden by the new one
+        hidden = lines
+        while hidden.size:
+            hidden = hidden[k[hidden] >= 0]
+            hidden = hidden[intersection(q, hidden) <= z[hidden, k[hidden]]]
+            k[hidden] -= 1
+        s = numpy.empty(lines.size)
+        s.fill(-numpy.inf)
+        top = k[lines] >= 0
+        s[top] = intersection(q, lines[top])
+        k[lines] += 1
+        v[lines, k[lines]] = q
+        z[lines, k[lines]] = s
+        z[lines, k[lines] + 1] = numpy.inf
+    # read the envelope
+    squared = numpy.empty((rows, cols))
+    k.fill(0)
+    for q in range(cols):
+        behind = index
+        while behind.size:
+            behind = behind[z[behind, k[behind] + 1] < q]
+            k[behind] += 1
+        root = v[index, k]
+        squared[:, q] = (q - root) ** 2 + f[index, root]
+    return squared
+
+
+def composite(landuse, colors, hillshadePer):
+    """
+    Description:
+    Creates RGB composite in a single pass - landuse z-indices are turned to
+    colors by lookup table, colors are multiplied by hillshadePer, cells
+    without texture (or color) get hillshade value in all bands.
+
+    Arguments:
+    (numpy array) landuse:
+        - z-index raster, NoData = NODATA
+
+    (dictionary) colors:
+        - {zIndex: (r, g, b)} lookup
+
+    (numpy array) hillshadePer:
+        - hillshade in 0 - 1 range
+
+    Returns:
+    (numpy array) rgb - interleaved uint8 array of (rows, cols, 3) shape
+    """
+    gray = numpy.rint(hillshadePer * 255)[:, :, None]
+    if not colors:
+        # no texture colored - hillshade only
+        gray = numpy.repeat(gray, 3, 2)
+        return numpy.clip(numpy.nan_to_num(gray), 0, 255).astype(numpy.uint8)
+    # lookup table - sorted z-indices and their colors
+    zIndices = numpy.array(sorted(colors), numpy.int32)
+    table = numpy.array([colors[z] for z in zIndices], FLOAT).reshape(-1, 3)
+    index = numpy.searchsorted(zIndices, landuse)
+    index = numpy.minimum(index, zIndices.size - 1)
+    textured = zIndices[index] == landuse
+    # color change by hillshade, merge together with hillshade
+    rgb = numpy.trunc(table[index] * hillshadePer[:, :, None])
+    textured = textured[:, :, None] & ~numpy.isnan(rgb)
+    rgb = numpy.where(textured, rgb, gray)
+    return numpy.clip(numpy.nan_to_num(rgb), 0, 255).astype(numpy.uint8)
@@ -12,6 +12,7 @@
 #               03/02/2013 - updated on_close()
 #               04/03/2013 - added reset_inputs()
 #               05/04/2013 - added edit_combobox_choice()
+#               18/10/2026 - edited get_values() - string texture params
 #
 # Copyright:    (c) dm 2012
 # Licence:      public :)
@@ -926,7 +927,10 @@ class TprtFrame(wx.Frame):
                         del d[2]
                         for index, value in enumerate(p[1:]):
                             if index != 0:
-                                value = int(value)      # texture params
+                                try:
+                                    value = int(value)  # texture params
+                                except ValueError:
+                                    value = value.title()   # e.g. profile
                             else:
                                 value = value.title()   # texture name
                             d.insert(index + 2, value)
@@ -0,0 +1,1176 @@
+#-------------------------------------------------------------------------------
+# Name:         TexturedPaintedRelief_io.py
+# Purpose:      Raster reading and writing for the NumPy engine.
+#
+# Author:       dm
+# Version:      1.0
+#
+# Created:      18/10/2026
+#
+# Copyright:    (c) dm 2012
+# Licence:      public :)
+#-------------------------------------------------------------------------------
+# standard modules
+import os
+import io
+import struct
+import zlib
+import tempfile
+# NumPy
+import numpy
+# arcpy - optional, used only for formats without a native reader/writer
+try:
+    import arcpy
+except ImportError:
+    arcpy = None
+# PIL - optional, used only for JPEG compressed TIFF
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+#-------------------------------------------------------------------------------
+class Grid(object):
+    """
+    Description:
+    In-memory raster - NumPy array with georeferencing.
+
+    Arguments:
+    (numpy array) array:
+        - cell values, NoData cells are NaN
+
+    (float) xMin:
+        - left edge of the grid in map units
+
+    (float) yMax:
+        - top edge of the grid in map units
+
+    (float) cellSize:
+        - cell size in map units
+    """
+    def __init__(self, array, xMin, yMax, cellSize):
+        self.array = array
+        self.xMin = float(xMin)
+        self.yMax = float(yMax)
+        self.cellSize = float(cellSize)
+
+    @property
+    def shape(self):
+        return self.array.shape[:2]
+
+    @property
+    def rows(self):
+        return self.shape[0]
+
+    @property
+    def cols(self):
+        return self.shape[1]
+
+    @property
+    def xMax(self):
+        return self.xMin + self.cols * self.cellSize
+
+    @property
+    def yMin(self):
+        return self.yMax - self.rows * self.cellSize
+
+    @property
+    def extent(self):
+        """
+        Returns:
+        (tuple) extent - (xMin, yMin, xMax, yMax)
+        """
+        return (self.xMin, self.yMin, self.xMax, self.yMax)
+
+    def read(self, row, col, rows, cols):
+        """
+        Description:
+        Reads grid window.
+
+        Arguments:
+        (integer) row, col:
+            - window upper left cell
+
+        (integer) rows, cols:
+            - window size
+
+        Returns:
+        (numpy array) window - float32, cells outside the grid are NaN
+        """
+        window = numpy.empty((rows, cols), numpy.float32)
+        window.fill(numpy.nan)
+        r0, r1 = max(row, 0), min(row + rows, self.rows)
+        c0, c1 = max(col, 0), min(col + cols, self.cols)
+        if r0 < r1 and c0 < c1:
+            window[r0 - row:r1 - row, c0 - col:c1 - col] = \
+                self.read_window(r0, r1, c0, c1)
+        return window
+
+    def read_window(self, r0, r1, c0, c1):
+        """
+        Description:
+        Reads cells [r0:r1, c0:c1] lying within the grid.
+
+        Note:
+        This method is overrided in lazy grids.
+        """
+        return self.array[r0:r1, c0:c1]
+
+
+class MappedGrid(Grid):
+    """
+    Description:
+    Memory-mapped raster - cells are read from the file when a window is
+    read, so only read windows take memory. Cells are stored uncompressed
+    in blocks (whole raster, strips or tiles).
+
+    Arguments:
+    (path string) sourceFile:
+        - path to the raster file
+
+    (numpy dtype) dataType:
+        - stored cell values type (including byte order)
+
+    (tuple) shape, blockShape:
+        - raster and block (rows, cols)
+
+    (numpy array) offsets:
+        - byte offsets of blocks - (blocks down, blocks across) array
+
+    (boolean) tiled:
+        - True - blocks are padded tiles, False - the last block (strip) is
+          cut at the raster bottom
+
+    (float) nodata:
+        - NoData value, None if there is none
+
+    (float) xMin, yMax, cellSize:
+        - see Grid
+    """
+    def __init__(self, sourceFile, dataType, shape, blockShape, offsets,
+                 tiled, nodata, xMin, yMax, cellSize):
+        self.sourceFile = str(sourceFile)
+        self.dataType = numpy.dtype(dataType)
+        self.size = tuple(shape)
+        self.blockShape = tuple(blockShape)
+        self.offsets = numpy.asarray(offsets).reshape(
+                       -(-self.size[0] // self.blockShape[0]),
+                       -(-self.size[1] // self.blockShape[1]))
+        self.tiled = tiled
+        self.nodata = nodata
+        self.xMin = float(xMin)
+        self.yMax = float(yMax)
+        self.cellSize = float(cellSize)
+
+    @property
+    def shape(self):
+        return self.size
+
+    @property
+    def array(self):
+        return self.read(0, 0, self.rows, self.cols)
+
+    def read_window(self, r0, r1, c0, c1):
+        """
+        Description:
+        Reads cells [r0:r1, c0:c1] - just the blocks under the window are
+        mapped.
+        """
+        blockRows, blockCols = self.blockShape
+        window = numpy.empty((r1 - r0, c1 - c0), numpy.float32)
+        for i in range(r0 // blockRows, (r1 - 1) // blockRows + 1):
+            for j in range(c0 // blockCols, (c1 - 1) // blockCols + 1):
+                top, left = i * blockRows, j * blockCols
+                rows = blockRows
+                if not self.tiled:
+                    rows = min(blockRows, self.rows - top)
+                block = numpy.memmap(self.sourceFile, self.dataType, "r",
+                                     int(self.offsets[i, j]),
+                                     (rows, blockCols))
+                br0, br1 = max(r0, top), min(r1, top + rows)
+                bc0, bc1 = max(c0, left), min(c1, left + blockCols)
+                window[br0 - r0:br1 - r0, bc0 - c0:bc1 - c0] = \
+                    block[br0 - top:br1 - top, bc0 - left:bc1 - left]
+                del block
+        if self.nodata is not None:
+            window[window == numpy.float32(self.nodata)] = numpy.nan
+        return window
+
+
+class ArcpyGrid(Grid):
+    """
+    Description:
+    Raster read by arcpy window by window (ESRI Grid, geodatabase rasters,
+    ...).
+
+    Arguments:
+    (path string) sourceFile:
+        - path to the raster
+    """
+    def __init__(self, sourceFile):
+        raster = arcpy.Raster(sourceFile)
+        self.sourceFile = str(sourceFile)
+        self.size = (raster.height, raster.width)
+        self.xMin = float(raster.extent.XMin)
+        self.yMax = float(raster.extent.YMax)
+        self.cellSize = float(raster.meanCellWidth)
+
+    @property
+    def shape(self):
+        return self.size
+
+    @property
+    def array(self):
+        return self.read(0, 0, self.rows, self.cols)
+
+    def read_window(self, r0, r1, c0, c1):
+        """
+        Description:
+        Reads cells [r0:r1, c0:c1] by arcpy.RasterToNumPyArray().
+        """
+        lowerLeft = arcpy.Point(self.xMin + (c0 + 0.5) * self.cellSize,
+                                self.yMax - (r1 - 0.5) * self.cellSize)
+        window = arcpy.RasterToNumPyArray(self.sourceFile, lowerLeft,
+                 c1 - c0, r1 - r0, numpy.nan)
+        return window.astype(numpy.float32)
+
+
+def data_type(sourceFile):
+    """
+    Description:
+    Gets geodata type the same way arcpy.Describe().dataType does, falls back
+    to file extension based guess when arcpy is not available.
+
+    Arguments:
+    (path string) sourceFile:
+        - path to geodata
+
+    Returns:
+    (string) dataType - 'ShapeFile', 'Tin' or 'RasterDataset'
+    """
+    if arcpy is not None:
+        return str(arcpy.Describe(sourceFile).dataType)
+    if str(sourceFile).lower().endswith(".shp"):
+        return "ShapeFile"
+    if os.path.isdir(sourceFile) and os.path.exists(
+       os.path.join(sourceFile, "tdenv.adf")):
+        return "Tin"
+    return "RasterDataset"
+
+
+def open_raster(sourceFile):
+    """
+    Description:
+    Opens raster dataset for windowed reads (Grid.read()).
+    Memory-mapped formats (nothing is read until a window is read):
+        - ESRI Float Grid (*.flt + *.hdr)
+        - ESRI BIL, single band (*.bil + *.hdr)
+        - uncompressed single band GeoTIFF (*.tif)
+    ESRI ASCII Grid (*.asc, *.txt) is read whole, windows of any other
+    raster are read by arcpy (if available).
+
+    Arguments:
+    (path string) sourceFile:
+        - path to the raster
+
+    Returns:
+    (Grid) grid - raster values (float32, NoData = NaN) + georeferencing
+    """
+    extension = os.path.splitext(str(sourceFile))[1].lower()
+    if extension in (".asc", ".txt"):
+        return read_ascii_grid(sourceFile)
+    elif extension == ".flt":
+        return map_float_grid(sourceFile)
+    elif extension == ".bil":
+        return map_bil(sourceFile)
+    elif extension in (".tif", ".tiff"):
+        grid = map_tiff(sourceFile)
+        if grid is not None:
+            return grid
+    if arcpy is not None:
+        return ArcpyGrid(sourceFile)
+    raise IOError("Raster '{0}' can't be read without arcpy.".format(
+                  sourceFile))
+
+
+def read_raster(sourceFile):
+    """
+    Description:
+    Reads whole raster dataset to Grid (see open_raster()).
+
+    Arguments:
+    (path string) sourceFile:
+        - path to the raster
+
+    Returns:
+    (Grid) grid - raster values (float32, NoData = NaN) + georeferencing
+    """
+    grid = open_raster(sourceFile)
+    if type(grid) is Grid:
+        return grid
+    return Grid(grid.array, grid.xMin, grid.yMax, grid.cellSize)
+
+
+def read_header(headerFile, lines=None):
+    """
+    Description:
+    Reads ESRI ASCII/Float Grid header (keyword value pairs).
+
+    Arguments:
+    (file object/path string) headerFile:
+        - opened ASCII Grid or path to *.hdr file
+
+    (integer) lines:
+        - number of header lines to read, None reads whole file
+
+    Returns:
+    (dictionary) header - lowercase keywords and string values
+    """
+    header = {}
+    if lines is None:
+        with open(headerFile) as hdr:
+            for line in hdr:
+                if line.strip():
+                    key, value = line.split()[:2]
+                    header[key.lower()] = value
+    else:
+        for i in range(lines):
+            key, value = headerFile.readline().split()[:2]
+            header[key.lower()] = value
+    return header
+
+
+def header_origin(header):
+    """
+    Description:
+    Gets the upper left corner and the cell size from ESRI Grid header.
+
+    Returns:
+    (tuple) (xMin, yMax, cellSize)
+    """
+    rows = int(header["nrows"])
+    cellSize = float(header["cellsize"])
+    if "xllcenter" in header:
+        xMin = float(header["xllcenter"]) - cellSize / 2
+        yMin = float(header["yllcenter"]) - cellSize / 2
+    else:
+        xMin = float(header["xllcorner"])
+        yMin = float(header["yllcorner"])
+    return xMin, yMin + rows * cellSize, cellSize
+
+
+def read_ascii_grid(sourceFile):
+    """
+    Description:
+    Reads ESRI ASCII Grid.
+
+    Arguments:
+    (path string) sourceFile:
+        - path to the *.asc file
+
+    Returns:
+    (Grid) grid
+    """
+    with open(sourceFile) as asc:
+        # header has 5 mandatory lines and optional NODATA_value line
+        header = read_header(asc, 5)
+        position = asc.tell()
+        line = asc.readline()
+        if line.lower().startswith("nodata_value"):
+            header["nodata_value"] = line.split()[1]
+        else:
+            asc.seek(position)
+        array = numpy.array(asc.read().split(), dtype=numpy.float32)
+    array = array.reshape(int(header["nrows"]), int(header["ncols"]))
+    if "nodata_value" in header:
+        array[array == float(header["nodata_value"])] = numpy.nan
+    xMin, yMax, cellSize = header_origin(header)
+    return Grid(array, xMin, yMax, cellSize)
+
+
+def map_float_grid(sourceFile):
+    """
+    Description:
+    Maps ESRI Float Grid (binary 32 bit float raster + text header).
+
+    Arguments:
+    (path string) sourceFile:
+        - path to the *.flt file
+
+    Returns:
+    (MappedGrid) grid
+    """
+    header = read_header(os.path.splitext(sourceFile)[0] + ".hdr")
+    byteOrder = "<"
+    if header.get("byteorder", "lsbfirst").lower() == "msbfirst":
+        byteOrder = ">"
+    shape = (int(header["nrows"]), int(header["ncols"]))
+    nodata = None
+    if "nodata_value" in header:
+        nodata = float(header["nodata_value"])
+    xMin, yMax, cellSize = header_origin(header)
+    return MappedGrid(sourceFile, byteOrder + "f4", shape, shape, [0], False,
+                      nodata, xMin, yMax, cellSize)
+
+
+def map_bil(sourceFile):
+    """
+    Description:
+    Maps single band ESRI BIL (raw integer/float raster + text header).
+
+    Arguments:
+    (path string) sourceFile:
+        - path to the *.bil file
+
+    Returns:
+    (MappedGrid) grid
+    """
+    header = read_header(os.path.splitext(sourceFile)[0] + ".hdr")
+    if int(header.get("nbands", 1)) != 1:
+        raise IOError("Raster '{0}' has more than one band.".format(
+                      sourceFile))
+    rows, cols = int(header["nrows"]), int(header["ncols"])
+    bits = int(header.get("nbits", 8))
+    kind = {"signedint": "i", "unsignedint": "u", "float": "f"}[
+            header.get("pixeltype", "unsignedint").lower()]
+    byteOrder = ">" if header.get("byteorder", "i").lower() in \
+                ("m", "motorola", "msbfirst") else "<"
+    # ulxmap, ulymap - center of the upper left cell
+    cellSize = float(header.get("xdim", 1))
+    xMin = float(header.get("ulxmap", 0)) - cellSize / 2
+    yMax = float(header.get("ulymap", rows - 1)) + cellSize / 2
+    nodata = None
+    if "nodata" in header:
+        nodata = float(header["nodata"])
+    return MappedGrid(sourceFile, "{0}{1}{2}".format(byteOrder, kind,
+                      bits // 8), (rows, cols), (rows, cols),
+                      [int(header.get("skipbytes", 0))], False, nodata, xMin,
+                      yMax, cellSize)
+
+
+def read_tiff_tags(tif):
+    """
+    Description:
+    Reads tags of the first TIFF (BigTIFF) image directory.
+
+    Arguments:
+    (file object) tif:
+        - TIFF opened in binary mode
+
+    Returns:
+    (tuple) (byteOrder, tags) - '<' or '>' and {tag: tuple of values},
+    ASCII values are strings
+    """
+    byteOrder = "<" if tif.read(2) == b"II" else ">"
+    version = struct.unpack(byteOrder + "H", tif.read(2))[0]
+    if version == 43:
+        tif.read(4)
+        countFormat, entryFormat, inline = "Q", "HHQ", 8
+    else:
+        countFormat, entryFormat, inline = "H", "HHI", 4
+    offsetFormat = byteOrder + ("Q" if version == 43 else "I")
+    tif.seek(struct.unpack(offsetFormat, tif.read(inline))[0])
+    count = struct.unpack(byteOrder + countFormat,
+                          tif.read(struct.calcsize(countFormat)))[0]
+    entries = []
+    for i in range(count):
+        entry = tif.read(struct.calcsize(entryFormat) + inline)
+        tag, fieldType, length = struct.unpack(byteOrder + entryFormat,
+                                 entry[:-inline])
+        entries.append((tag, fieldType, length, entry[-inline:]))
+    # value formats, rationals are pairs of integers
+    formats = {1: "B", 2: "s", 3: "H", 4: "I", 5: "II", 6: "b", 7: "B",
+               8: "h", 9: "i", 10: "ii", 11: "f", 12: "d", 16: "Q", 17: "q",
+               18: "Q"}
+    tags = {}
+    for tag, fieldType, length, value in entries:
+        if fieldType not in formats:
+            continue
+        valueFormat = formats[fieldType]
+        if fieldType == 2:
+            valueFormat = "{0}s".format(length)
+        else:
+            valueFormat = valueFormat * length
+        size = struct.calcsize("<" + valueFormat)
+        if size > inline:
+            tif.seek(struct.unpack(offsetFormat, value)[0])
+            value = tif.read(size)
+        values = struct.unpack(byteOrder + valueFormat, value[:size])
+        if fieldType == 2:
+            values = values[0].decode("ascii", "ignore").strip("\0 ")
+        tags[tag] = values
+    return byteOrder, tags
+
+
+def map_tiff(sourceFile):
+    """
+    Description:
+    Maps uncompressed single band GeoTIFF (strips or tiles). Georeferencing
+    is taken from GeoTIFF tags or world file, NoData from GDAL_NODATA tag.
+
+    Arguments:
+    (path string) sourceFile:
+        - path to the *.tif file
+
+    Returns:
+    (MappedGrid) grid - None if the TIFF can't be mapped
+    """
+    with open(sourceFile, "rb") as tif:
+        byteOrder, tags = read_tiff_tags(tif)
+    if tags.get(259, (1,))[0] != 1 or tags.get(277, (1,))[0] != 1:
+        return None
+    rows, cols = tags[257][0], tags[256][0]
+    bits = tags.get(258, (1,))[0]
+    kind = {1: "u", 2: "i", 3: "f"}.get(tags.get(339, (1,))[0])
+    if kind is None or bits not in (8, 16, 32, 64):
+        return None
+    # georeferencing
+    if 33550 in tags and 33922 in tags:
+        cellSize = tags[33550][0]
+        i, j, k, x, y, z = tags[33922][:6]
+        xMin, yMax = x - i * cellSize, y + j * tags[33550][1]
+        # GTRasterTypeGeoKey - pixel is point
+        keys = tags.get(34735, ())
+        for n in range(4, len(keys) - 3, 4):
+            if keys[n] == 1025 and keys[n + 3] == 2:
+                xMin -= cellSize / 2
+                yMax += cellSize / 2
+    else:
+        worldFile = os.path.splitext(sourceFile)[0] + ".tfw"
+        if not os.path.exists(worldFile):
+            return None
+        with open(worldFile) as wld:
+            a, d, b, e, c, f = [float(v) for v in wld.read().split()[:6]]
+        cellSize = a
+        xMin, yMax = c - a / 2, f - e / 2
+    nodata = None
+    if 42113 in tags:
+        nodata = float(tags[42113])
+    if 322 in tags:
+        blockShape = (tags[323][0], tags[322][0])
+        offsets, tiled = tags[324], True
+    else:
+        blockShape = (tags.get(278, (rows,))[0], cols)
+        offsets, tiled = tags[273], False
+    return MappedGrid(sourceFile, "{0}{1}{2}".format(byteOrder, kind,
+                      bits // 8), (rows, cols), (min(blockShape[0], rows) if
+                      not tiled else blockShape[0], blockShape[1]), offsets,
+                      tiled, nodata, xMin, yMax, cellSize)
+
+
+def read_shapefile(sourceFile):
+    """
+    Description:
+    Reads ShapeFile geometry (*.shp) - points, polylines and polygons,
+    Z and M values are ignored.
+
+    Arguments:
+    (path string) sourceFile:
+        - path to the *.shp file
+
+    Returns:
+    (tuple) (shapeType, records, extent)
+        - shapeType - 'Point', 'Polyline' or 'Polygon'
+        - records - list of features, feature is list of parts (polyline
+          paths, polygon rings or points) as (n, 2) arrays of x, y
+        - extent - (xMin, yMin, xMax, yMax)
+    """
+    with open(sourceFile, "rb") as shp:
+        header = shp.read(100)
+        content = shp.read()
+    shapeType = struct.unpack("<i", header[32:36])[0]
+    # Z and M types are 10 and 20 higher
+    names = {1: "Point", 8: "Point", 3: "Polyline", 5: "Polygon"}
+    if shapeType > 30 or shapeType % 10 not in names:
+        raise IOError("ShapeFile '{0}' type is not supported.".format(
+                      sourceFile))
+    extent = struct.unpack("<4d", header[36:68])
+    records = []
+    position = 0
+    while position + 8 <= len(content):
+        # record header - big endian content length in 16 bit words
+        length = struct.unpack(">i", content[position + 4:position + 8])[0]
+        record = content[position + 8:position + 8 + length * 2]
+        position += 8 + length * 2
+        recordType = struct.unpack("<i", record[:4])[0] % 10
+        if recordType == 0:
+            continue
+        if recordType == 1:
+            records.append([numpy.frombuffer(record[4:20], "<f8").reshape(
+                            1, 2)])
+            continue
+        if recordType == 8:
+            count = struct.unpack("<i", record[36:40])[0]
+            records.append([numpy.frombuffer(record[40:40 + count * 16],
+                            "<f8").reshape(-1, 2)])
+            continue
+        parts, count = struct.unpack("<2i", record[36:44])
+        starts = list(numpy.frombuffer(record[44:44 + parts * 4], "<i4"))
+        points = numpy.frombuffer(record[44 + parts * 4:44 + parts * 4 +
+                                  count * 16], "<f8").reshape(-1, 2)
+        records.append([points[start:end] for start, end in
+                        zip(starts, starts[1:] + [count])])
+    return names[shapeType % 10], records, extent
+
+
+def to_bytes(array):
+    """
+    Description:
+    Gets raw bytes of the array (ndarray.tostring was renamed to tobytes).
+    """
+    if hasattr(array, "tobytes"):
+        return array.tobytes()
+    return array.tostring()
+
+
+def write_world_file(outputFile, xMin, yMax, cellSize):
+    """
+    Description:
+    Writes world file (*.tfw, *.pgw, *.jgw) next to the output image.
+    """
+    base, extension = os.path.splitext(outputFile)
+    worldFile = base + "." + extension[1] + extension[-1] + "w"
+    with open(worldFile, "w") as wld:
+        wld.write("\n".join(str(v) for v in [cellSize, 0.0, 0.0, -cellSize,
+                  xMin + cellSize / 2.0, yMax - cellSize / 2.0]) + "\n")
+
+
+def spatial_reference(sourceFile):
+    """
+    Description:
+    Gets coordinate system of the geodata - EPSG code and WKT by arcpy, WKT
+    of *.prj file next to the geodata without arcpy. ESRI WKIDs (53xxx,
+    54xxx, 1xxxxx, e.g. 102067 Krovak) are not EPSG codes, they are
+    described by WKT only.
+
+    Arguments:
+    (path string) sourceFile:
+        - path to geodata
+
+    Returns:
+    (tuple) (epsg, geographic, wkt) - EPSG code (None if unknown), True for
+    geographic coordinate systems and WKT (None if unknown)
+    """
+    if arcpy is None:
+        prjFile = os.path.splitext(str(sourceFile))[0] + ".prj"
+        if not os.path.exists(prjFile):
+            return None, False, None
+        with open(prjFile) as prj:
+            wkt = prj.read().strip()
+        return None, wkt.startswith("GEOGCS"), wkt or None
+    reference = arcpy.Describe(sourceFile).spatialReference
+    # exported string is WKT followed by ';' separated domains
+    wkt = reference.exportToString().split(";")[0] or None
+    code = reference.factoryCode
+    if not code or code >= 100000 or 53000 <= code < 55000:
+        code = None
+    return code, reference.type == "Geographic", wkt
+
+
+def write_aux_file(outputFile, wkt):
+    """
+    Description:
+    Writes coordinate system of the output image to *.aux.xml file (read by
+    ArcGIS and GDAL) - for images without GeoTIFF EPSG code.
+
+    Arguments:
+    (path string) outputFile:
+        - output image path
+
+    (string) wkt:
+        - coordinate system WKT
+    """
+    wkt = wkt.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    with open(outputFile + ".aux.xml", "w") as aux:
+        aux.write("<PAMDataset>\n  <SRS>{0}</SRS>\n</PAMDataset>\n".format(
+                  wkt))
+
+
+def lzw_compress(data):
+    """
+    Description:
+    Compresses bytes by TIFF flavour of LZW (MSB first codes, code width
+    grows one code early, table is cleared when it is full).
+
+    Arguments:
+    (bytes) data:
+        - data to compress
+
+    Returns:
+    (bytes) compressed - compressed data
+    """
+    clear, end = 256, 257
+    codes = {}
+    nextCode, width = 258, 9
+    # emitted codes and their widths, packed at the end
+    emitted, widths = [clear], [width]
+    prefix = None
+    for byte in bytearray(data):
+        if prefix is None:
+            prefix = byte
+            continue
+        entry = (prefix << 8) | byte
+        code = codes.get(entry)
+        if code is not None:
+            prefix = code
+            continue
+        emitted.append(prefix)
+        widths.append(width)
+        codes[entry] = nextCode
+        nextCode += 1
+        if nextCode == 4094:
+            emitted.append(clear)
+            widths.append(width)
+            codes = {}
+            nextCode, width = 258, 9
+        elif nextCode > (1 << width) - 1:
+            width += 1
+        prefix = byte
+    if prefix is not None:
+        emitted.append(prefix)
+        widths.append(width)
+    emitted.append(end)
+    widths.append(width)
+    output = bytearray()
+    buffered = bits = 0
+    for code, width in zip(emitted, widths):
+        buffered = (buffered << width) | code
+        bits += width
+        while bits >= 8:
+            bits -= 8
+            output.append((buffered >> bits) & 0xff)
+        buffered &= (1 << bits) - 1
+    if bits:
+        output.append((buffered << (8 - bits)) & 0xff)
+    return bytes(output)
+
+
+class TiffImage(object):
+    """
+    Description:
+    One image (resolution level) of TiffWriter output - tile grid, tiles
+    written so far and tiles waiting for the rest of their cells.
+
+    Arguments:
+    (integer) rows, cols:
+        - image size
+
+    (integer) tileSize:
+        - TIFF tile side in pixels
+    """
+    def __init__(self, rows, cols, tileSize):
+        self.rows = rows
+        self.cols = cols
+        self.tileRows = -(-rows // tileSize)
+        self.tileCols = -(-cols // tileSize)
+        tiles = self.tileRows * self.tileCols
+        self.offsets = numpy.zeros(tiles, numpy.uint64)
+        self.counts = numpy.zeros(tiles, numpy.uint64)
+        # partially filled tiles {index: [tile, cells left]}
+        self.pending = {}
+        # file the tiles are written to, set by TiffWriter
+        self.file = None
+
+
+class TiffWriter(object):
+    """
+    Description:
+    Streaming writer of tiled RGB GeoTIFF. Blocks (strips, tiles or whole
+    image) are written as they come, finished TIFF tiles go to the file
+    right away, so memory use is bounded by the tiles the blocks don't fill
+    yet (one row of tiles for strips). Image directories are reserved at
+    the file start and filled by TiffWriter.close(). BigTIFF is written for
+    images over 4 GB.
+    With overviews every finished tile is averaged (2 x 2 box) into the
+    next resolution level right away, down to the level fitting one tile.
+    Levels are streamed to temporary files next to the output and joined by
+    TiffWriter.close() in Cloud Optimized GeoTIFF order - directories first,
+    then tiles from the smallest overview to the full resolution.
+
+    Arguments:
+    (path string) outputFile:
+        - path to the output image
+
+    (integer) rows, cols:
+        - image size
+
+    (float) xMin, yMax, cellSize:
+        - georeferencing (GeoTIFF tags)
+
+    (string) compression:
+        - None | 'Deflate' | 'LZW' | 'JPEG'
+        - 'JPEG' needs PIL, 'LZW' is much slower than 'Deflate'
+        - default None - uncompressed
+
+    (integer) tileSize:
+        - TIFF tile side in pixels, multiple of 16
+        - default 256
+
+    (integer) epsg, (boolean) geographic, (string) wkt:
+        - coordinate system by spatial_reference(), WKT is written to
+          *.aux.xml file when there is no EPSG code
+        - default None - no coordinate system
+
+    (integer) quality:
+        - JPEG quality
+        - default 75
+
+    (boolean) overviews:
+        - True - Cloud Optimized GeoTIFF with overviews
+        - default False - full resolution only
+    """
+    compressions = {None: 1, "LZW": 5, "JPEG": 7, "Deflate": 8}
+
+    def __init__(self, outputFile, rows, cols, xMin, yMax, cellSize,
+                 compression=None, tileSize=256, epsg=None, geographic=False,
+                 wkt=None, quality=75, overviews=False):
+        if compression not in self.compressions:
+            raise ValueError("Compression '{0}' is not available.".format(
+                             compression))
+        if compression == "JPEG" and Image is None:
+            raise ValueError("JPEG compression needs PIL.")
+        if tileSize % 16:
+            raise ValueError("Tile size must be a multiple of 16.")
+        self.compression = compression
+        self.tileSize = tileSize
+        self.quality = quality
+        self.images = [TiffImage(rows, cols, tileSize)]
+        while overviews and (rows > tileSize or cols > tileSize):
+            rows, cols = -(-rows // 2), -(-cols // 2)
+            self.images.append(TiffImage(rows, cols, tileSize))
+        # uncompressed size + compression overhead decides the TIFF flavour
+        cells = sum(image.rows * image.cols for image in self.images)
+        tiles = sum(image.counts.size for image in self.images)
+        self.big = cells * 3 * 1.01 + tiles * 1024 > 2 ** 32
+        self.geoTags = self.create_geo_tags(xMin, yMax, cellSize, epsg,
+                                            geographic)
+        self.outputFile = outputFile
+        self.wkt = wkt if epsg is None else None
+        self.file = open(outputFile, "wb")
+        if self.big:
+            self.file.write(struct.pack("<2sHHHQ", b"II", 43, 8, 0, 16))
+        else:
+            self.file.write(struct.pack("<2sHI", b"II", 42, 8))
+        self.ifdOffset = self.file.tell()
+        self.file.write(self.directories())
+        for image in self.images:
+            if overviews:
+                image.file = tempfile.TemporaryFile(suffix=".tmp",
+                             prefix="tpr", dir=os.path.dirname(
+                             os.path.abspath(outputFile)))
+            else:
+                image.file = self.file
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        if excType is None:
+            self.close()
+        else:
+            for image in self.images:
+                image.file.close()
+            self.file.close()
+
+    def create_geo_tags(self, xMin, yMax, cellSize, epsg, geographic):
+        """
+        Description:
+        Creates GeoTIFF tags - pixel scale, tie point and geokeys (raster
+        type = pixel is area, coordinate system).
+
+        Returns:
+        (list) tags - (tag, field type, values)
+        """
+        keys = [(1025, 0, 1, 1)]
+        if epsg is not None:
+            keys.append((1024, 0, 1, 2 if geographic else 1))
+            keys.append((2048 if geographic else 3072, 0, 1, epsg))
+        keys.sort()
+        return [(33550, 12, [cellSize, cellSize, 0.0]),
+                (33922, 12, [0.0, 0.0, 0.0, xMin, yMax, 0.0]),
+                (34735, 3, [1, 1, 0, len(keys)] +
+                 [value for key in keys for value in key])]
+
+    def create_tags(self, level):
+        """
+        Description:
+        Creates image directory tags, GeoTIFF tags are set for the full
+        resolution only.
+
+        Arguments:
+        (integer) level:
+            - resolution level, 0 is the full resolution
+
+        Returns:
+        (list) tags - (tag, field type, values) sorted by tag
+        """
+        image = self.images[level]
+        jpeg = self.compression == "JPEG"
+        offsets = 16 if self.big else 4
+        tags = [(256, 4, [image.cols]),                 # ImageWidth
+                (257, 4, [image.rows]),                 # ImageLength
+                (258, 3, [8, 8, 8]),                    # BitsPerSample
+                (259, 3, [self.compressions[self.compression]]),
+                (262, 3, [6 if jpeg else 2]),           # Photometric
+                (277, 3, [3]),                          # SamplesPerPixel
+                (284, 3, [1]),                          # PlanarConfig
+                (322, 4, [self.tileSize]),              # TileWidth
+                (323, 4, [self.tileSize]),              # TileLength
+                (324, offsets, image.offsets),          # TileOffsets
+                (325, offsets, image.counts),           # TileByteCounts
+                (339, 3, [1, 1, 1])]                    # SampleFormat
+        if level > 0:
+            tags.append((254, 4, [1]))                  # reduced resolution
+        if self.compression in ("LZW", "Deflate"):
+            tags.append((317, 3, [2]))                  # Predictor
+        if jpeg:
+            tags.append((530, 3, [1, 1]))               # YCbCrSubSampling
+        if level == 0:
+            tags.extend(self.geoTags)
+        tags.sort(key=lambda tag: tag[0])
+        return tags
+
+    def directories(self):
+        """
+        Description:
+        Packs image directories (IFD) of all levels, each followed by its
+        values that don't fit the entries. Size doesn't depend on the
+        values.
+
+        Returns:
+        (bytes) directories
+        """
+        formats = {3: "H", 4: "I", 12: "d", 16: "Q"}
+        entryFormat, countFormat, offsetFormat = ("<HHQ", "<Q", "<Q") if \
+            self.big else ("<HHI", "<H", "<I")
+        inline = struct.calcsize(offsetFormat)
+        directories = b""
+        for level in range(len(self.images)):
+            tags = self.create_tags(level)
+            offset = self.ifdOffset + len(directories)
+            extraOffset = (offset + struct.calcsize(countFormat) + len(tags) *
+                           (struct.calcsize(entryFormat) + inline) + inline)
+            entries = []
+            extra = b""
+            for tag, fieldType, values in tags:
+                values = numpy.asarray(values).astype("<" + formats[fieldType])
+                data = to_bytes(values)
+                if len(data) <= inline:
+                    value = data + b"\0" * (inline - len(data))
+                else:
+                    value = struct.pack(offsetFormat, extraOffset + len(extra))
+                    extra += data + b"\0" * (len(data) % 2)
+                entries.append(struct.pack(entryFormat, tag, fieldType,
+                                           len(values)) + value)
+            # next directory follows the values, the last one points to 0
+            nextOffset = extraOffset + len(extra)
+            if level == len(self.images) - 1:
+                nextOffset = 0
+            directories += (struct.pack(countFormat, len(entries)) +
+                            b"".join(entries) +
+                            struct.pack(offsetFormat, nextOffset) + extra)
+        return directories
+
+    def write(self, row, col, rgb, level=0):
+        """
+        Description:
+        Writes image block.
+
+        Arguments:
+        (integer) row, col:
+            - block upper left pixel
+
+        (numpy array) rgb:
+            - uint8 block of (rows, cols, 3) shape
+
+        (integer) level:
+            - resolution level, overviews are written by TiffWriter itself
+            - default 0 - full resolution
+        """
+        image = self.images[level]
+        size = self.tileSize
+        rows, cols = rgb.shape[:2]
+        for tileRow in range(row // size, -(-(row + rows) // size)):
+            for tileCol in range(col // size, -(-(col + cols) // size)):
+                top, left = tileRow * size, tileCol * size
+                # block part inside the tile
+                r0, r1 = max(row, top), min(row + rows, top + size)
+                c0, c1 = max(col, left), min(col + cols, left + size)
+                index = tileRow * image.tileCols + tileCol
+                if index not in image.pending:
+                    # edge tiles are padded, padding needs no data
+                    cells = ((min(top + size, image.rows) - top) *
+                             (min(left + size, image.cols) - left))
+                    image.pending[index] = [numpy.zeros((size, size, 3),
+                                            numpy.uint8), cells]
+                tile = image.pending[index]
+                tile[0][r0 - top:r1 - top, c0 - left:c1 - left] = \
+                    rgb[r0 - row:r1 - row, c0 - col:c1 - col]
+                tile[1] -= (r1 - r0) * (c1 - c0)
+                if tile[1] <= 0:
+                    self.write_tile(level, index,
+                                    image.pending.pop(index)[0])
+
+    def encode(self, tile):
+        """
+        Description:
+        Compresses one tile.
+
+        Arguments:
+        (numpy array) tile:
+            - uint8 array of (tileSize, tileSize, 3) shape
+
+        Returns:
+        (bytes) data - tile data as stored in the file
+        """
+        if self.compression == "JPEG":
+            data = io.BytesIO()
+            Image.fromarray(tile, "RGB").save(data, "JPEG",
+                            quality=self.quality, subsampling=0)
+            return data.getvalue()
+        if self.compression is not None:
+            # horizontal differencing predictor
+            tile = tile.copy()
+            tile[:, 1:] -= tile[:, :-1].copy()
+        data = to_bytes(numpy.ascontiguousarray(tile))
+        if self.compression == "Deflate":
+            return zlib.compress(data, 6)
+        if self.compression == "LZW":
+            return lzw_compress(data)
+        return data
+
+    def write_tile(self, level, index, tile):
+        """
+        Description:
+        Appends encoded tile to the level file, averages it to the next
+        level (if any).
+        """
+        image = self.images[level]
+        data = self.encode(tile)
+        image.offsets[index] = image.file.tell()
+        image.counts[index] = len(data)
+        image.file.write(data)
+        if level + 1 < len(self.images):
+            size = self.tileSize
+            top = index // image.tileCols * size
+            left = index % image.tileCols * size
+            tile = tile[:min(size, image.rows - top),
+                        :min(size, image.cols - left)].astype(numpy.uint16)
+            # odd edges are averaged with themselves
+            if tile.shape[0] % 2:
+                tile = numpy.concatenate((tile, tile[-1:]), 0)
+            if tile.shape[1] % 2:
+                tile = numpy.concatenate((tile, tile[:, -1:]), 1)
+            tile = (tile[::2, ::2] + tile[1::2, ::2] + tile[::2, 1::2] +
+                    tile[1::2, 1::2] + 2) // 4
+            self.write(top // 2, left // 2, tile.astype(numpy.uint8),
+                       level + 1)
+
+    def close(self):
+        """
+        Description:
+        Writes unfinished tiles (unwritten cells are black), joins levels,
+        fills the image directories and closes the file.
+        """
+        empty = numpy.zeros((self.tileSize, self.tileSize, 3), numpy.uint8)
+        for level, image in enumerate(self.images):
+            for index in sorted(image.pending):
+                self.write_tile(level, index, image.pending.pop(index)[0])
+            for index in numpy.nonzero(image.counts == 0)[0]:
+                self.write_tile(level, index, empty)
+        # levels are joined from the smallest, tiles in row major order
+        for image in self.images[::-1]:
+            if image.file is self.file:
+                continue
+            offsets = numpy.zeros_like(image.offsets)
+            for index in range(image.offsets.size):
+                image.file.seek(int(image.offsets[index]))
+                offsets[index] = self.file.tell()
+                self.file.write(image.file.read(int(image.counts[index])))
+            image.file.close()
+            image.offsets = offsets
+        self.file.seek(self.ifdOffset)
+        self.file.write(self.directories())
+        self.file.close()
+        if self.wkt:
+            write_aux_file(self.outputFile, self.wkt)
+
+
+def write_png(outputFile, rgb):
+    """
+    Description:
+    Writes RGB PNG (deflate compressed, no filtering).
+
+    Arguments:
+    (path string) outputFile:
+        - path to the output image
+
+    (numpy array) rgb:
+        - uint8 array of (rows, cols, 3) shape
+    """
+    def chunk(chunkType, data):
+        return (struct.pack(">I", len(data)) + chunkType + data +
+                struct.pack(">I", zlib.crc32(chunkType + data) & 0xffffffff))
+    rows, cols = rgb.shape[:2]
+    # every scanline starts with filter type byte (0 - none)
+    scanlines = numpy.zeros((rows, cols * 3 + 1), numpy.uint8)
+    scanlines[:, 1:] = rgb.reshape(rows, cols * 3)
+    with open(outputFile, "wb") as png:
+        png.write(b"\x89PNG\r\n\x1a\n")
+        png.write(chunk(b"IHDR", struct.pack(">IIBBBBB", cols, rows,
+                                             8, 2, 0, 0, 0)))
+        png.write(chunk(b"IDAT", zlib.compress(to_bytes(scanlines), 6)))
+        png.write(chunk(b"IEND", b""))
+
+
+def write_rgb(outputFile, rgb, xMin, yMax, cellSize, compression=None,
+              epsg=None, geographic=False, wkt=None, overviews=False):
+    """
+    Description:
+    Writes georeferenced RGB image. TIFF (tiled GeoTIFF by TiffWriter) and
+    PNG (georeferenced by world file) are written natively, JPEG needs
+    arcpy.
+
+    Arguments:
+    (path string) outputFile:
+        - *.tif | *.png | *.jpg path
+
+    (numpy array) rgb:
+        - uint8 array of (rows, cols, 3) shape
+
+    (float) xMin, yMax, cellSize:
+        - output georeferencing
+
+    (string) compression, (boolean) overviews:
+        - TIFF only, see TiffWriter
+
+    (integer) epsg, (boolean) geographic, (string) wkt:
+        - coordinate system by spatial_reference(), see TiffWriter - other
+          formats get WKT in *.aux.xml file
+    """
+    extension = os.path.splitext(outputFile)[1].lower()
+    if extension in (".tif", ".tiff"):
+        with TiffWriter(outputFile, rgb.shape[0], rgb.shape[1], xMin, yMax,
+                        cellSize, compression, epsg=epsg,
+                        geographic=geographic, wkt=wkt,
+                        overviews=overviews) as tif:
+            tif.write(0, 0, rgb)
+        return
+    elif extension == ".png":
+        write_png(outputFile, rgb)
+        if wkt:
+            write_aux_file(outputFile, wkt)
+    elif arcpy is not None:
+        rows = rgb.shape[0]
+        lowerLeft = arcpy.Point(xMin, yMax - rows * cellSize)
+        bands = [arcpy.NumPyArrayToRaster(numpy.ascontiguousarray(
+                 rgb[:, :, i]), lowerLeft, cellSize, cellSize) for i in
+                 range(3)]
+        arcpy.CompositeBands_management(";".join(str(b) for b in bands),
+                                        outputFile)
+        if wkt:
+            arcpy.DefineProjection_management(outputFile, wkt)
+        return
+    else:
+        raise IOError("Output format '{0}' can't be written without "
+                      "arcpy.".format(extension))
+    write_world_file(outputFile, xMin, yMax, cellSize)
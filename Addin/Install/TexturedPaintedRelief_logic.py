@@ -16,6 +16,35 @@
 #               26/03/2013 - added PointBasedTexture() = edited textures logic
 #               26/03/2013 - edited create_textures()
 #               23/04/2013 - edited Plough()
+#               18/10/2026 - added NumPy engine (create_array() methods)
+#               18/10/2026 - added tiled execution mode, footprint()
+#               18/10/2026 - added parallel tiles processing (render_tile_job)
+#               18/10/2026 - edited points_distribution() - jittered lattice
+#               18/10/2026 - point based textures stamped from kernels
+#               18/10/2026 - removed GetRasterProperties() calls
+#               18/10/2026 - single pass RGB compositing (create_rgb())
+#               18/10/2026 - landuse created by Dem.add_textures()
+#               18/10/2026 - added memory workspace
+#               18/10/2026 - added persistent textures cache
+#               18/10/2026 - added incremental re-render (run_stage())
+#               18/10/2026 - edited hillshade_to_percent() - one pass,
+#                            added create_variants()
+#               18/10/2026 - added cast shadows by sweep-line horizon, relief()
+#               18/10/2026 - TIFF output streamed to tiled GeoTIFF (TiffWriter)
+#               18/10/2026 - added Cloud Optimized GeoTIFF output (overviews)
+#               18/10/2026 - terrain read by windows (memory-mapped, lazy)
+#               18/10/2026 - ShapeFiles rasterized natively (to_raster())
+#               18/10/2026 - added Lines profile (distance transform)
+#               18/10/2026 - counter-based random rasters for arcpy processing
+#               18/10/2026 - added value, Perlin and fBm Noise
+#               18/10/2026 - edited Plough() - closed form furrows
+#               18/10/2026 - points shared by (randomness, density)
+#               18/10/2026 - textures clipped to their areas (clip_texture())
+#               18/10/2026 - textures kept as sparse rasters (SparseRaster)
+#               18/10/2026 - added multiresolution textures (texture_cellSize)
+#               18/10/2026 - tiles shadow overlap capped (maxShadow)
+#               18/10/2026 - arcpy processing merges rasters by geoprocessing,
+#                            composites by strips
 #
 # Copyright:    (c) dm 2012
 # Licence:      public :)
@@ -27,11 +56,27 @@ import math
 import time
 from datetime import timedelta
 import shutil
+import tempfile
 import operator
-# wxPython
-from wx.lib.pubsub import Publisher as pub
-# arcpy
-import arcpy
+import copy
+import multiprocessing
+# NumPy
+import numpy
+# wxPython - optional, messages are printed when it is not available
+try:
+    from wx.lib.pubsub import Publisher as pub
+except ImportError:
+    pub = None
+# arcpy - optional, NumPy engine runs without it
+try:
+    import arcpy
+except ImportError:
+    arcpy = None
+# TexturedPaintedRelief_engine, TexturedPaintedRelief_io &
+# TexturedPaintedRelief_cache
+import TexturedPaintedRelief_engine as tprengine
+import TexturedPaintedRelief_io as tprio
+import TexturedPaintedRelief_cache as tprcache
 #-------------------------------------------------------------------------------
 class Texture(object):
     """
@@ -55,15 +100,17 @@ class Texture(object):
         self.zIndex = zIndex
         self.colors = colors
         # user independent arguments; just referenced, will be overrided
-        self.dataType = str(arcpy.Describe(areaOfInterest).dataType)
+        self.dataType = tprio.data_type(areaOfInterest)
         self.texture = None      # texture raster
-        self.landuse = None      # landuse raster
         self.cellSize = 9999.0   # cellSize - just a dum number to avoid errors
+        self.engine = None       # NumPy engine, set by Processor
 
-    def to_raster(self, sourceFile, value=1):
+    def to_raster(self, sourceFile, value=1, buffer=0):
         """
         Description:
-        Converts ShapeFile to raster.
+        Converts ShapeFile to raster - geometry is rasterized in process on
+        the processing grid (Engine.read_mask()), no helper files are
+        created.
 
         Arguments:
         (path string) sourceFile:
@@ -73,25 +120,18 @@ class Texture(object):
             - output raster value
             - default value = 1
 
+        (float) buffer:
+            - buffer distance of lines/points in map units
+            - default 0 - no buffer
+
         Returns:
         (raster) outRaster/sourceFile - converted/original raster
         """
         if self.dataType == "ShapeFile":
-            # get ShapeFile name
-            inShapeName = str(arcpy.Describe(sourceFile).baseName)
-            outShapeName = "copy" + inShapeName + ".shp"
-            outRastername = inShapeName[:13]
-            # copy ShapeFile to 'Scratch' dir
-            helperPath = os.path.join(arcpy.env.workspace, outShapeName)
-            helperFile = arcpy.CopyFeatures_management(sourceFile, helperPath)
-            # prepare and calculate _TPR_ field values
-            arcpy.AddField_management(helperFile, "_TPR_", "LONG")
-            arcpy.CalculateField_management(helperFile, "_TPR_", value)
-            # convert to raster
-            outRaster = arcpy.FeatureToRaster_conversion(helperFile, "_TPR_",
-                        outRastername, self.cellSize)
-            # delete helperFile and return outRaster
-            arcpy.Delete_management(helperFile)
+            mask = self.engine.read_mask(sourceFile, self.dataType, buffer)
+            outRaster = self.engine.to_raster(numpy.where(mask, value,
+                        tprengine.NODATA).astype(numpy.int32),
+                        tprengine.NODATA)
             return outRaster
         else:
             return sourceFile
@@ -114,6 +154,73 @@ class Texture(object):
         default = arcpy.sa.CreateConstantRaster(0)
         return default
 
+    def area_array(self):
+        """
+        Description:
+        Reads self.areaOfInterest as a mask on the NumPy engine grid.
+
+        Returns:
+        (numpy array) mask - True inside self.areaOfInterest
+        """
+        return self.engine.read_mask(self.areaOfInterest, self.dataType)
+
+    def create_array(self):
+        """
+        Description:
+        NumPy engine version of Texture.create().
+
+        Returns:
+        (numpy array) default - constant value (0) array with same extent as DEM
+
+        Note:
+        This method is overrided in each subclass of 'Texture' class.
+        """
+        default = self.engine.constant(0)
+        return default
+
+    def footprint(self):
+        """
+        Description:
+        Gets texture footprint - how far from a cell (in map units) texture
+        objects can reach. Used to set tiles overlap.
+
+        Returns:
+        (float) footprint
+
+        Note:
+        This method is overrided in subclasses using neighbourhoods.
+        """
+        return 0.0
+
+    def relief(self):
+        """
+        Description:
+        Gets texture relief - the largest height (in map units) texture
+        objects can add to or take from the terrain. Used to set tiles overlap
+        for cast shadows.
+
+        Returns:
+        (float) relief
+
+        Note:
+        This method is overrided in each subclass of 'Texture' class.
+        """
+        return 0.0
+
+    def parameters(self):
+        """
+        Description:
+        Gets parameters the texture raster depends on (user referenced ones
+        except areaOfInterest, zIndex and colors) - used as cache key.
+
+        Returns:
+        (list) parameters - sorted (name, value) pairs
+        """
+        runtime = ["areaOfInterest", "zIndex", "colors", "dataType", "texture",
+                   "cellSize", "engine", "kernel"]
+        return sorted((name, value) for name, value in vars(self).items() if
+                      name not in runtime)
+
 
 class PointBasedTexture(Texture):
     """
@@ -144,9 +251,27 @@ class PointBasedTexture(Texture):
         self.randomness = randomness
         self.density = density
         self.size = float(size) / 2
-        self.normalRaster = None    # same raster for all PointBasedTextures
-        self.xmap = None            # created and overrided by
-        self.ymap = None            # Processor.create_textures()
+        self.kernel = None          # set by PointBasedTexture.stamp()
+
+    def footprint(self):
+        """
+        Description:
+        Gets texture footprint - object radius (half of the square side).
+
+        Returns:
+        (float) footprint
+        """
+        return self.size
+
+    def relief(self):
+        """
+        Description:
+        Gets texture relief - objects height.
+
+        Returns:
+        (float) relief
+        """
+        return abs(float(getattr(self, "height", 0)))
 
     def points_distribution(self, randomness, density):
         """
@@ -157,23 +282,91 @@ class PointBasedTexture(Texture):
         (raster) points - cells definning points are 1, others are NoData
 
         Note:
-        self.areaOfInterest must have values > 1 else points won't be created.
-        """
-        # reclassify 0 (zero) values if needed
-        areaMin = arcpy.Raster(self.areaOfInterest).minimum
-        if areaMin < 1:
-            fix = arcpy.sa.Reclassify(self.areaOfInterest, "VALUE",
-                                      "{0} 1".format(areaMin))
-            # set new areaOfInterest attribute
-            setattr(self, "areaOfInterest", fix)
-        # generate points
-        densityFix = round(self.density / self.cellSize, 2)
-        nrmDsr = arcpy.sa.Int(self.normalRaster * self.randomness + densityFix)
-        points = arcpy.sa.Con((arcpy.sa.Mod(self.xmap, nrmDsr) == 0) &
-                              (arcpy.sa.Mod(self.ymap, nrmDsr) == 0) &
-                              self.areaOfInterest, 1)
+        Points are generated by Engine.lattice_points() (self.engine is set
+        by Processor.create_textures() for arcpy processing too), lattice
+        raster is shared by textures with the same (randomness, density) and
+        the same engine window.
+        """
+        engine = self.engine
+        key = ("raster", randomness, density, engine.cellSize,
+               engine.rowOffset, engine.colOffset, engine.shape)
+        if key not in self.engine.lattices:
+            rows, cols = self.engine.lattice_points(randomness, density)
+            lattice = numpy.zeros(self.engine.shape, numpy.uint8)
+            lattice[rows, cols] = 1
+            self.engine.lattices[key] = self.engine.to_raster(lattice, 0)
+        # cells with any value (0 too) are inside self.areaOfInterest
+        points = arcpy.sa.Con(arcpy.sa.IsNull(self.areaOfInterest) == 0,
+                              self.engine.lattices[key])
         return points
 
+    def points_coordinates(self):
+        """
+        Description:
+        Creates points distribution as cell indices - points by
+        Engine.lattice_points() inside self.areaOfInterest.
+
+        Returns:
+        (tuple) (rows, cols) - points cell indices
+        """
+        rows, cols = self.engine.lattice_points(self.randomness, self.density)
+        inside = self.engine.mask_at(self.areaOfInterest, self.dataType,
+                                     rows, cols)
+        return rows[inside], cols[inside]
+
+    def create_kernel(self):
+        """
+        Description:
+        Creates single object height kernel.
+
+        Returns:
+        (tuple) (dy, dx, values) - offsets in cells and object heights
+
+        Note:
+        This method is overrided in each subclass of 'PointBasedTexture' class.
+        """
+        dy, dx, distance = self.engine.disk_offsets(self.size)
+        return dy, dx, numpy.zeros(distance.shape)
+
+    def stamp(self, points=None):
+        """
+        Description:
+        Creates texture by splatting object kernel at each point - kernel is
+        created once per texture (all objects are identical).
+
+        Arguments:
+        (tuple) points:
+            - optional argument
+            - (rows, cols) points cell indices
+            - default set to points_coordinates()
+
+        Returns:
+        (numpy array) texture - cells with no objects are NaN
+        """
+        if points is None:
+            points = self.points_coordinates()
+        if self.kernel is None:
+            self.kernel = self.create_kernel()
+        rows, cols = points
+        return self.engine.stamp(rows, cols, self.kernel)
+
+    def stamp_raster(self, points):
+        """
+        Description:
+        PointBasedTexture.stamp() for arcpy processing.
+
+        Arguments:
+        (raster) points:
+            - points distribution raster (see points_distribution())
+
+        Returns:
+        (raster) texture - cells with no objects are NoData
+        """
+        points = self.engine.read_array(points)
+        texture = self.stamp(numpy.nonzero(points > 0))
+        texture = self.engine.to_raster(texture)
+        return texture
+
 
 class Squares(PointBasedTexture):
     """
@@ -207,10 +400,30 @@ class Squares(PointBasedTexture):
         fix = self.to_raster(self.areaOfInterest)
         setattr(self, "areaOfInterest", fix)
         # create own texture
-        size = (self.size * 2) / self.cellSize
-        squares = arcpy.sa.FocalStatistics(
-                  self.points_distribution(self.randomness, self.density),
-                  arcpy.sa.NbrRectangle(size, size)) * self.height
+        squares = self.stamp_raster(
+                  self.points_distribution(self.randomness, self.density))
+        return squares
+
+    def create_kernel(self):
+        """
+        Description:
+        Creates square kernel - NbrRectangle(size, size) of self.height.
+
+        Returns:
+        (tuple) (dy, dx, values)
+        """
+        dy, dx = self.engine.square_offsets((self.size * 2) / self.cellSize)
+        return dy, dx, numpy.repeat(float(self.height), dy.size)
+
+    def create_array(self):
+        """
+        Description:
+        NumPy engine version of Squares.create().
+
+        Returns:
+        (numpy array) squares - texture array, cells with no objects are NaN
+        """
+        squares = self.stamp()
         return squares
 
 
@@ -246,13 +459,33 @@ class Cones(PointBasedTexture):
         fix = self.to_raster(self.areaOfInterest)
         setattr(self, "areaOfInterest", fix)
         # create own texture
-        cones1 = arcpy.sa.Abs(arcpy.sa.EucDistance(
-                 self.points_distribution(self.randomness, self.density),
-                 self.size))
-        # invert and fix cones highs
-        maxHeight = float(str(arcpy.GetRasterProperties_management(cones1,
-                    "MAXIMUM")).replace(",", "."))
-        cones = (maxHeight - cones1) / (maxHeight / self.height)
+        cones = self.stamp_raster(
+                self.points_distribution(self.randomness, self.density))
+        return cones
+
+    def create_kernel(self):
+        """
+        Description:
+        Creates cone kernel - inverted distance from the cone centre.
+
+        Returns:
+        (tuple) (dy, dx, values)
+        """
+        dy, dx, distance = self.engine.disk_offsets(self.size)
+        # invert and fix cones highs - maximum distance is self.size, so
+        # values don't depend on processed extent (tile)
+        cones = (self.size - distance) / (self.size / self.height)
+        return dy, dx, cones
+
+    def create_array(self):
+        """
+        Description:
+        NumPy engine version of Cones.create().
+
+        Returns:
+        (numpy array) cones - texture array, cells with no objects are NaN
+        """
+        cones = self.stamp()
         return cones
 
 
@@ -295,14 +528,48 @@ class Spheres(PointBasedTexture):
         else:
             points = self.points_distribution(self.randomness, self.density)
         # create own texture
-        spheres = arcpy.sa.SquareRoot(arcpy.sa.Power(self.size ,2) -
-                  arcpy.sa.Power(arcpy.sa.EucDistance(points, self.size), 2))
-        # fix spheres highs
-        fix1 = spheres - float(str(arcpy.GetRasterProperties_management(spheres,
-               "MINIMUM")).replace(",", "."))
-        fix2 = float(str(arcpy.GetRasterProperties_management(fix1,
-               "MAXIMUM")).replace(",", ".")) / (self.size * 2)
-        spheres = fix1 / fix2
+        spheres = self.stamp_raster(points)
+        return spheres
+
+    def relief(self):
+        """
+        Description:
+        Gets texture relief - spheres height is their diameter.
+
+        Returns:
+        (float) relief
+        """
+        return self.size * 2
+
+    def create_kernel(self):
+        """
+        Description:
+        Creates sphere kernel - hemisphere over the sphere centre.
+
+        Returns:
+        (tuple) (dy, dx, values)
+        """
+        dy, dx, distance = self.engine.disk_offsets(self.size)
+        spheres = numpy.sqrt(self.size ** 2 - distance ** 2)
+        # fix spheres highs - values are in <0, self.size> range, so they are
+        # stretched to <0, self.size * 2> without extent (tile) statistics
+        spheres = spheres * 2
+        return dy, dx, spheres
+
+    def create_array(self, specialPoints=None):
+        """
+        Description:
+        NumPy engine version of Spheres.create().
+
+        Arguments:
+        (tuple) specialPoints:
+            - optional argument, see Spheres.create()
+            - (rows, cols) points cell indices
+
+        Returns:
+        (numpy array) spheres - texture array, cells with no objects are NaN
+        """
+        spheres = self.stamp(specialPoints)
         return spheres
 
 
@@ -329,55 +596,85 @@ class Plough(Spheres):
         # set own attributes
         self.angle = angle
 
+    def footprint(self):
+        """
+        Description:
+        Gets texture footprint - furrows are evaluated in each cell, no
+        neighbourhood is used.
+
+        Returns:
+        (float) footprint
+        """
+        return 0.0
+
+    def relief(self):
+        """
+        Description:
+        Gets texture relief - plough values are in <-1, 0>.
+
+        Returns:
+        (float) relief
+        """
+        return 1.0
+
+    def furrows(self, mask):
+        """
+        Description:
+        Evaluates furrows profile in closed form - lines of spheres of the
+        former points lattice merge to cylinders, so the value is given by
+        the distance from the nearest line, i.e. by the periodic rotated
+        coordinate. Lines are 'interval' apart, parallel with Y-axis rotated
+        by 'angle' (clockwise) around the map origin. Cylinder heights are
+        stretched to <-1, 0> like the former spheres raster - the ridge
+        between lines (half 'interval' away) is 0. Just cells inside mask
+        are evaluated.
+
+        Arguments:
+        (numpy array) mask:
+            - True inside area of interest, self.engine grid
+
+        Returns:
+        (numpy array) plough - values in <-1, 0>, NaN out of mask
+        """
+        engine = self.engine
+        rows, cols = numpy.nonzero(mask)
+        x = engine.xMin + (cols + 0.5) * engine.cellSize
+        y = engine.yMax - (rows + 0.5) * engine.cellSize
+        angle = math.radians(self.angle)
+        u = (x * math.cos(angle) - y * math.sin(angle)) / self.density
+        # distance from the nearest line
+        distance = numpy.abs(u - numpy.round(u)) * self.density
+        height = numpy.sqrt(numpy.maximum(self.size ** 2 - distance ** 2, 0))
+        ridge = math.sqrt(self.size ** 2 - (self.density / 2.0) ** 2)
+        plough = engine.constant(numpy.nan)
+        plough[rows, cols] = -(height - ridge) / (self.size - ridge)
+        return plough
+
     def create(self):
         """
         Description:
-        Creates polughing texture.
+        Creates polughing texture - furrows are evaluated on the processing
+        grid (Plough.furrows()), no helper raster is created and rotated.
 
         Returns:
         (raster) plough - texture raster with none NoData cells
         """
-        # prepare helper raster-------------------------------------------------
-        # helper raster name
-        hlpName = str("hlp" + arcpy.Describe(self.areaOfInterest).baseName)[:13]
-        # set new extent side (Pythagorean theorem)
-        extent = arcpy.Describe(self.areaOfInterest).extent
-        deltaX = abs(extent.XMax - extent.XMin)
-        deltaY = abs(extent.YMax - extent.YMin)
-        newExtentSide = math.sqrt(pow(deltaX, 2) + pow(deltaY, 2)) / 2
-        # get extent centeroid
-        centerX = extent.XMin + deltaX / 2
-        centerY = extent.YMin + deltaY / 2
-        center = "{0} {1}".format(centerX, centerY)
-        # set new extent values
-        newXMin = centerX - newExtentSide * 1.5
-        newYMin = centerY - newExtentSide * 1.5
-        newXMax = centerX + newExtentSide * 1.5
-        newYMax = centerY + newExtentSide * 1.5
-        # create helper raster - extent equal square raster
-        hlpRaster = arcpy.sa.CreateConstantRaster(1, "INTEGER", self.cellSize,
-                    arcpy.Extent(newXMin, newYMin, newXMax, newYMax))
-        # generate points-------------------------------------------------------
-        # quit ymap, set mask and helper areaOfInterest
-        setattr(self, "ymap", self.xmap)
-        mask = self.to_raster(self.areaOfInterest)
-        setattr(self, "areaOfInterest", str(hlpRaster))
-        # create, rotate and crop points
-        pts = self.points_distribution(self.randomness, self.density)
-        ptsRot = arcpy.Rotate_management(pts, "rotated", self.angle, center)
-        ptsRotCrp = arcpy.sa.Con(mask, ptsRot)
-        ptsRotCrp.save(hlpName)
-        #set proper areaOfInterest and dataType, delete points rasters
-        setattr(self, "areaOfInterest", str(ptsRotCrp))
-        setattr(self, "dataType", arcpy.Describe(self.areaOfInterest).dataType)
-        # create Plough texture based on rotated points-------------------------
-        # plough values in interval <-1, 0>
-        spheres = super(Plough, self).create(self.areaOfInterest)
-        plough = (spheres / (self.size * 2)) * -1
-        # delete helper rasters, return plough texture
-        del pts, ptsRot, ptsRotCrp, spheres
+        mask = self.engine.read_array(self.to_raster(self.areaOfInterest))
+        # Con(mask, ...) - cells with 0 value are out of the area
+        plough = self.engine.to_raster(self.furrows(numpy.nan_to_num(mask)
+                                                    != 0))
         return plough
 
+    def create_array(self):
+        """
+        Description:
+        NumPy engine version of Plough.create().
+
+        Returns:
+        (numpy array) plough - texture array
+        """
+        return self.furrows(self.area_array())
+
 
 class Lines(Texture):
     """
@@ -393,34 +690,102 @@ class Lines(Texture):
 
     (integer) height:
         - line height in map units
+
+    (string) profile:
+        - line cross-section
+        - 'Flat' - constant height (default)
+        - 'Crowned' - rises to abs(height) at the centerline (road)
+        - 'Sunken' - sinks to -abs(height) at the centerline (river)
     """
-    def __init__(self, areaOfInterest, zIndex, colors, width, height):
+    def __init__(self, areaOfInterest, zIndex, colors, width, height,
+                 profile="Flat"):
         # initialize parent class
         Texture.__init__(self, areaOfInterest, zIndex, colors)
         # set own attributes
         self.width = float(width)
         self.height = height
-        # set own cellSize
-        self.cellSize = round(self.width / 2, 2)
+        self.profile = str(profile).title()
+        # set own cellSize - profiled cross-section needs more cells
+        if self.profile == "Flat":
+            self.cellSize = round(self.width / 2, 2)
+        else:
+            self.cellSize = round(self.width / 11, 2)
+
+    def footprint(self):
+        """
+        Description:
+        Gets texture footprint - buffer distance.
+
+        Returns:
+        (float) footprint
+        """
+        return self.width / 2
+
+    def relief(self):
+        """
+        Description:
+        Gets texture relief - lines height.
+
+        Returns:
+        (float) relief
+        """
+        return abs(float(self.height))
+
+    def cross_section(self, distance):
+        """
+        Description:
+        Gets lines height by distance from the centerline - parabolic profile
+        falling to 0 at the line edge.
+
+        Arguments:
+        (raster or numpy array) distance:
+            - distance from the centerline in map units
+
+        Returns:
+        (raster or numpy array) height
+        """
+        shape = 1 - (distance / (self.width / 2)) ** 2
+        if self.profile == "Sunken":
+            return shape * -abs(float(self.height))
+        return shape * abs(float(self.height))
 
     def create(self):
         """
         Description:
-        Creates buffered line texture.
+        Creates buffered line texture - lines are buffered (ROUND ends) by
+        the rasterization, no Buffer_analysis() output is written. Profiled
+        lines are shaped by the distance from the rasterized centerlines.
 
         Returns:
         (raster) lines - texture raster
         """
-        outputName = arcpy.Describe(self.areaOfInterest).name[:-4]
-        # buffer
-        lineBuff = arcpy.Buffer_analysis(self.areaOfInterest, outputName,
-                   self.width / 2, "FULL", "ROUND", "NONE")
-        # convert to raster
-        lines = self.to_raster(lineBuff, self.height)
-        # delete helper file
-        arcpy.Delete_management(lineBuff)
+        if self.profile == "Flat":
+            lines = self.to_raster(self.areaOfInterest, self.height,
+                                   self.width / 2)
+        else:
+            centerlines = self.to_raster(self.areaOfInterest)
+            distance = arcpy.sa.EucDistance(centerlines, self.width / 2,
+                                            arcpy.env.cellSize)
+            lines = self.cross_section(distance)
         return lines
 
+    def create_array(self):
+        """
+        Description:
+        NumPy engine version of Lines.create() - lines (centerlines) are
+        rasterized and buffered by distance transform, buffer and profile
+        come from the same distance raster.
+
+        Returns:
+        (numpy array) lines - texture array
+        """
+        distance = self.engine.distance(self.area_array(), self.width / 2)
+        if self.profile == "Flat":
+            lines = numpy.where(numpy.isnan(distance), numpy.nan, self.height)
+        else:
+            lines = self.cross_section(distance)
+        return lines.astype(tprengine.FLOAT)
+
 
 class Noise(Texture):
     """
@@ -435,13 +800,39 @@ class Noise(Texture):
 
     (integer) maximum:
         - maximum texture value
+
+    (string) noiseType:
+        - 'Uniform' - random integers in each cell (default)
+        - 'Value' - smooth value noise
+        - 'Perlin' - smooth gradient noise
+
+    (integer) wavelength:
+        - smooth noise features size in map units
+
+    (integer) octaves:
+        - number of smooth noise octaves (fBm), 1 - single octave
+        - default 1
     """
-    def __init__(self, areaOfInterest, zIndex, colors, minimum, maximum):
+    def __init__(self, areaOfInterest, zIndex, colors, minimum, maximum,
+                 noiseType="Uniform", wavelength=0, octaves=1):
         # initialize parent class
         Texture.__init__(self, areaOfInterest, zIndex, colors)
         # set own attributes
         self.min = int(minimum)
         self.max = int(maximum)
+        self.noiseType = str(noiseType).title()
+        self.wavelength = float(wavelength)
+        self.octaves = int(octaves)
+
+    def relief(self):
+        """
+        Description:
+        Gets texture relief - the largest absolute random value.
+
+        Returns:
+        (float) relief
+        """
+        return float(max(abs(self.min), abs(self.max)))
 
     def create(self):
         """
@@ -454,16 +845,42 @@ class Noise(Texture):
         # check data type - raster needed
         fix = self.to_raster(self.areaOfInterest)
         setattr(self, "areaOfInterest", fix)
-        # create own texture
-        outName = (arcpy.Describe(self.areaOfInterest).baseName)[:5] + "_rand"
-        outExtent = arcpy.Raster(self.areaOfInterest).extent
-        distribution = "INTEGER {0} {1}".format(self.min, self.max)
-        noise1 = arcpy.CreateRandomRaster_management(arcpy.env.workspace,
-                 outName, distribution, outExtent, arcpy.env.cellSize)
+        # create own texture - seeded by the cells, no random raster dataset
+        # is written (self.engine is set by Processor.prepare_textures())
+        noise1 = self.engine.to_raster(self.random_array())
         # cropp random raster to self.areaOfInterest and return texture
         noise = arcpy.sa.Con(self.areaOfInterest, noise1)
         return noise
 
+    def create_array(self):
+        """
+        Description:
+        NumPy engine version of Noise.create().
+
+        Returns:
+        (numpy array) noise - texture array, cells with no objects are NaN
+        """
+        noise = self.random_array()
+        noise[~self.area_array()] = numpy.nan
+        return noise
+
+    def random_array(self):
+        """
+        Description:
+        Creates random values of self.engine grid - uniform integers or
+        smooth noise scaled to <self.min, self.max>.
+
+        Returns:
+        (numpy array) noise - random array
+        """
+        if self.noiseType == "Uniform" or self.wavelength <= 0:
+            return self.engine.random_integers(self.min, self.max,
+                                               self.zIndex)
+        noise = self.engine.procedural_noise(self.noiseType, self.wavelength,
+                                             self.octaves, self.zIndex)
+        return (self.min + noise * (self.max - self.min)).astype(
+                tprengine.FLOAT)
+
 
 class Null(Texture):
     """
@@ -483,6 +900,16 @@ class Null(Texture):
         # set own attributes
         self.value = int(value)
 
+    def relief(self):
+        """
+        Description:
+        Gets texture relief - absolute value.
+
+        Returns:
+        (float) relief
+        """
+        return float(abs(self.value))
+
     def create(self):
         """
         Description:
@@ -495,14 +922,22 @@ class Null(Texture):
         if self.dataType == "ShapeFile":
             null = self.to_raster(self.areaOfInterest, self.value)
         else:
-            inRaster = self.areaOfInterest
-            reclassValue = self.value
-            inMin = arcpy.GetRasterProperties_management(inRaster, "MINIMUM")
-            inMax = arcpy.GetRasterProperties_management(inRaster, "MAXIMUM")
-            remap = "{0} {1} {2}".format(inMin, inMax, reclassValue)
-            null = arcpy.sa.Reclassify(inRaster, "Value", remap, "NODATA")
+            # all data cells to self.value - no statistics needed
+            null = arcpy.sa.SetNull(arcpy.sa.IsNull(self.areaOfInterest),
+                                    self.value)
         return null
 
+    def create_array(self):
+        """
+        Description:
+        NumPy engine version of Null.create().
+
+        Returns:
+        (numpy array) null - texture array, cells with no objects are NaN
+        """
+        null = numpy.where(self.area_array(), self.value, numpy.nan)
+        return null.astype(tprengine.FLOAT)
+
 
 class Dem():
     """
@@ -528,11 +963,26 @@ class Dem():
 
     (float) cellSize:
         - cellSize returned by Processor.set_cellSize()
+
+    (Engine) engine:
+        - NumPy engine, None means arcpy processing
+        - default None
+
+    (Grid) terrain:
+        - terrain already read by the NumPy engine (Processor.read_terrain())
+        - default None - terrain is read from sourceFile
     """
-    def __init__(self,sourceFile,azimuth,altitude,zfactor,shadows,cellSize):
-        terrainType = str(arcpy.Describe(sourceFile).dataType)
+    def __init__(self,sourceFile,azimuth,altitude,zfactor,shadows,cellSize,
+                 engine=None, terrain=None):
+        self.engine = engine
+        terrainType = tprio.data_type(sourceFile)
+        # NumPy engine - Grid object
+        if terrain is not None:
+            self.dem = terrain
+        elif self.engine is not None:
+            self.dem = self.engine.read_terrain(sourceFile, terrainType)
         # Tin processing
-        if terrainType  == "Tin":
+        elif terrainType  == "Tin":
             self.dem = arcpy.TinRaster_3d(sourceFile, "dem", "INT", "LINEAR",
                        "CELLSIZE {0}".format(str(cellSize).replace(".", ",")))
         # RasterDataset processing
@@ -552,9 +1002,13 @@ class Dem():
                 self.dem = arcpy.Resample_management(sourceFile, "dem",
                                                      cellSize, "BILINEAR")
         # proper DEM extent for processing
-        self.extent = arcpy.Raster(self.dem).extent
+        if self.engine is not None:
+            self.extent = self.dem.extent
+        else:
+            self.extent = arcpy.Raster(self.dem).extent
+        # landuse (z-index) raster
+        self.landuse = None     ## will be set by Dem.add_textures()
         # hillshading attributes of the textured DEM
-        self.hillshade = None   ## will be set by Dem.hillshade_to_percent()
         self.azimuth = azimuth
         self.alitude = altitude
         self.zfactor = zfactor
@@ -563,10 +1017,35 @@ class Dem():
         if shadows == "Yes":
             self.shadows = True
 
+    def window(self, engine):
+        """
+        Description:
+        Creates Dem object for a NumPy engine window (tile).
+
+        Arguments:
+        (Engine) engine:
+            - window engine by Engine.window()
+
+        Returns:
+        (Dem) dem - Dem object covering just the window
+        """
+        dem = copy.copy(self)
+        row = engine.rowOffset - self.engine.rowOffset
+        col = engine.colOffset - self.engine.colOffset
+        dem.engine = engine
+        dem.dem = tprio.Grid(self.dem.read(row, col, engine.rows,
+                             engine.cols), engine.xMin, engine.yMax,
+                             engine.cellSize)
+        dem.extent = dem.dem.extent
+        dem.landuse = None
+        return dem
+
     def add_textures(self, textures):
         """
         Description:
-        Orders, merges and add textures to the DEM.
+        Orders, merges and add textures to the DEM. Landuse (textures
+        reclassified by z-index) is created by the same merge and set to
+        Dem.landuse.
 
         Arguments:
         (list of lists) textures:
@@ -576,16 +1055,34 @@ class Dem():
         (raster) texturedDEM - texturedDEM = DEM + textures
 
         Note:
-        Raster 'bumpmap' must be 32b so it can represents negative values.
+        Dem.landuse is NumPy array (NumPy engine) or raster (arcpy - rasters
+        are merged by geoprocessing, no full extent array is read).
         """
         try:
             # sort textures
-            inRasters = ";".join([str(t.texture) for t in sorted(textures,
-                        key=operator.attrgetter("zIndex"), reverse=True)])
-            # join textures
-            joinedTextures = arcpy.MosaicToNewRaster_management(inRasters,
-                             arcpy.env.workspace, "jnttxtrs", "",
-                             "32_BIT_SIGNED", "", 1, "First")
+            textures = sorted(textures, key=operator.attrgetter("zIndex"),
+                              reverse=True)
+            zIndices = [t.zIndex for t in textures]
+            # NumPy engine
+            if self.engine is not None:
+                joinedTextures, self.landuse = self.engine.mosaic(
+                    [t.texture for t in textures], zIndices)
+                terrain = self.dem.array
+                texturedDEM = numpy.where(numpy.isnan(joinedTextures),
+                              terrain, joinedTextures + terrain)
+                return texturedDEM
+            # join textures, the first texture with data wins
+            inRasters = ";".join([str(t.texture) for t in textures])
+            joinedTextures = arcpy.Raster(arcpy.MosaicToNewRaster_management(
+                             inRasters, arcpy.env.workspace, "jnttxtrs", "",
+                             "32_BIT_FLOAT", "", 1, "First").getOutput(0))
+            # landuse - textures reclassified by z-index, the same merge
+            inRasters = ";".join([str(arcpy.sa.Con(arcpy.sa.IsNull(
+                        t.texture) == 0, z)) for t, z in zip(textures,
+                        zIndices)])
+            self.landuse = arcpy.Raster(arcpy.MosaicToNewRaster_management(
+                           inRasters, arcpy.env.workspace, "landuse", "",
+                           "32_BIT_SIGNED", "", 1, "First").getOutput(0))
             # merge textures with terrain
             texturedDEM = arcpy.sa.Con(arcpy.sa.IsNull(joinedTextures),
                           self.dem, joinedTextures + arcpy.Raster(self.dem))
@@ -593,7 +1090,7 @@ class Dem():
         # if something went wrong ...
         except Exception as exception:
             message = "Merging rasters failed - {0}.".format(exception)
-            if __name__ == "__main__":
+            if __name__ == "__main__" or pub is None:
                 sys.exit(message)
             else:
                 pub.sendMessage("CHANGE", message)
@@ -610,12 +1107,15 @@ class Dem():
         Returns:
         (raster) hsPer - raster with values in 0 - 1 range
         """
-        # create and save hillshade
-        self.hillshade = arcpy.sa.Hillshade(texturedDEM, self.azimuth,
-                         self.alitude, self.shadows, self.zfactor)
-        self.hillshade.save("hillshade")
-        # convert hillshade to percent
-        hsPer = self.hillshade / 255.0
+        # NumPy engine - percent values computed directly
+        if self.engine is not None:
+            hsPer = self.engine.hillshade(texturedDEM, self.azimuth,
+                    self.alitude, self.zfactor, self.shadows)
+            return hsPer
+        # create hillshade and convert it to percent - shadows are modelled
+        # by arcpy, the sweep-line needs the whole DEM in memory
+        hsPer = arcpy.sa.Hillshade(texturedDEM, self.azimuth, self.alitude,
+                                   self.shadows, self.zfactor) / 255.0
         return hsPer
 
 
@@ -628,58 +1128,277 @@ class Processor():
     Arguments:
     (list) uData:
         - user data
+
+    (string) engine:
+        - raster engine - 'ArcPy' or 'NumPy'
+        - default None - 'ArcPy' if arcpy is available, 'NumPy' otherwise
+
+    (integer) tileSize:
+        - tile side in cells, turns on tiled execution (NumPy engine only)
+        - default None - whole extent is processed at once
+
+    (integer) workers:
+        - number of processes rendering tiles (tiled execution only)
+        - default 1
+
+    (integer) seed:
+        - random seed of the NumPy engine, same seed = same output
+        - default None - random output
+
+    (string) workspace:
+        - where intermediate rasters are kept - 'Disk' or 'Memory'
+        - 'Disk' - 'tprScratch' directory next to the output
+        - 'Memory' - arcpy 'in_memory' workspace / NumPy arrays, rasters
+          bigger than spillSize are spilled to 'tprScratch'
+        - default 'Disk'
+
+    (integer) spillSize:
+        - spill threshold of the memory workspace in MB
+        - default 512
+
+    (path string) cache:
+        - directory of the persistent textures and DEM cache (NumPy engine)
+        - default None - no cache
+
+    (integer) cacheSize:
+        - cache disk budget in MB, least recently used entries are evicted
+        - default 2048
+
+    (string) compression:
+        - TIFF output compression - None, 'Deflate', 'LZW' or 'JPEG'
+        - default None - uncompressed
+
+    (boolean) overviews:
+        - True - TIFF output is Cloud Optimized GeoTIFF with overviews
+          generated during the render
+        - default False - full resolution only
+
+    (boolean) multiresolution:
+        - True - textures are created at their own cellSize and resampled
+          when composited, DEM, hillshade and output have the user cellSize
+        - default False - everything at the smallest texture cellSize
+
+    (integer) maxShadow:
+        - tiled execution - the longest cast shadow in cells kept across
+          tile edges (tiles overlap by it), longer shadows are cut there
+        - default None - tileSize
     """
-    def __init__(self, uData):
+    def __init__(self, uData, engine=None, tileSize=None, workers=1,
+                 seed=None, workspace="Disk", spillSize=512, cache=None,
+                 cacheSize=2048, compression=None, overviews=False,
+                 multiresolution=False, maxShadow=None):
         self.data = uData
+        self.multiresolution = multiresolution
         # initialize textures
         self.textures = self.initialize_textures()
         # set cellSize
         self.cellSize = self.set_cellSize()
+        # set raster engine, None means arcpy processing
+        self.engine = self.set_engine(engine, seed)
+        if multiresolution and self.engine is None:
+            raise ValueError("Multiresolution compositing needs the NumPy "
+                             "engine.")
+        if tileSize is not None and self.engine is None:
+            raise ValueError("Tiled execution needs the NumPy engine.")
+        if workers > 1 and tileSize is None:
+            raise ValueError("Parallel processing needs tiled execution.")
+        self.tileSize = tileSize
+        self.maxShadow = maxShadow if maxShadow is not None else tileSize
+        self.workers = workers
+        self.seed = seed
         # set workspace directory
+        if workspace not in ("Disk", "Memory"):
+            raise ValueError("Workspace '{0}' is not available.".format(
+                             workspace))
+        self.inMemory = workspace == "Memory"
+        self.spillSize = spillSize * 1024 * 1024
+        self.workspace = self.prepare_workspace()
+        # spilled arrays directory - kept across runs for stages results,
+        # deleted by Processor.close()
+        self.spillOwner = True
+        if self.engine is not None and self.inMemory:
+            self.engine.spillDir = tempfile.mkdtemp("", "tprSpill",
+                                   os.path.dirname(self.workspace))
+            self.engine.spillSize = self.spillSize
+        # set persistent cache
+        if cache is not None:
+            if self.engine is None:
+                raise ValueError("Cache needs the NumPy engine.")
+            self.engine.cache = tprcache.Cache(cache, cacheSize)
+        # set output path, TIFF options and coordinate system
+        self.output = str(self.data[0][6])
+        if compression not in tprio.TiffWriter.compressions:
+            raise ValueError("Compression '{0}' is not available.".format(
+                             compression))
+        self.compression = compression
+        self.overviews = overviews
+        self.spatialReference = (None, False, None)   ## set by main()
+        # pipeline stages results {name: (fingerprint, results)}, see
+        # Processor.run_stage()
+        self.stages = {}
+
+    def __getstate__(self):
+        """
+        Description:
+        Copies (tiles) and worker processes get Processor without stages
+        results, they don't own spilled arrays directory.
+        """
+        state = self.__dict__.copy()
+        state["stages"] = {}
+        state["spillOwner"] = False
+        return state
+
+    def __del__(self):
+        if getattr(self, "spillOwner", False):
+            self.close()
+
+    def close(self):
+        """
+        Description:
+        Frees stages results and deletes spilled arrays - call when the
+        Processor is not needed any more (done when it is disposed).
+        """
+        self.stages = {}
+        self.delete_spilled()
+        if self.engine is not None and self.engine.spillDir is not None \
+           and os.path.exists(self.engine.spillDir):
+            shutil.rmtree(self.engine.spillDir, True)
+
+    def spilled_files(self, results=None):
+        """
+        Description:
+        Gets files of spilled arrays (memmaps) of stage results.
+
+        Arguments:
+        (dictionary) results:
+            - stage results
+            - default None - results of all stages
+
+        Returns:
+        (set) files - paths of spilled arrays files
+        """
+        if results is None:
+            return set(f for fingerprint, r in self.stages.values() for f in
+                       self.spilled_files(r))
+        return set(os.path.abspath(a.filename) for a in results.values() if
+                   isinstance(a, numpy.memmap) and a.filename is not None)
+
+    def delete_spilled(self, keep=(), files=None):
+        """
+        Description:
+        Deletes spilled arrays files (memory workspace).
+
+        Arguments:
+        (set) keep:
+            - files to keep, e.g. Processor.spilled_files()
+            - default () - all files are deleted
+
+        (set) files:
+            - files to delete
+            - default None - all files of the spill directory
+        """
+        if self.engine is None or self.engine.spillDir is None or \
+           not os.path.exists(self.engine.spillDir):
+            return
+        if files is None:
+            files = [os.path.abspath(os.path.join(self.engine.spillDir, n))
+                     for n in os.listdir(self.engine.spillDir)]
+        for spillFile in files:
+            if spillFile not in keep:
+                try:
+                    os.remove(spillFile)
+                except OSError:     # still mapped (Windows), deleted later
+                    pass
+
+    def update(self, uData):
+        """
+        Description:
+        Sets new user data for the next Processor.main() run. Results of
+        pipeline stages not affected by the change are reused (NumPy
+        engine), e.g. color change reruns just TPR compositing.
+
+        Arguments:
+        (list) uData:
+            - user data
+        """
+        self.data = uData
+        self.textures = self.initialize_textures()
+        self.cellSize = self.set_cellSize()
+        if self.engine is not None:
+            self.engine.cellSize = float(self.cellSize)
+            # referenced layers may have changed
+            self.engine.rasters.clear()
+            self.engine.extents.clear()
         self.workspace = self.prepare_workspace()
-        # set output path
         self.output = str(self.data[0][6])
 
     def prepare_workspace(self):
         """
         Description:
-        Tests if 'Scratch' dir exists, if not, creates it.
+        Tests if 'Scratch' dir exists, if not, creates it. Memory workspace
+        creates it only when rasters are spilled to disk.
 
         Returns:
         (path string) workspaceDir - path to the workspaceDir
         """
         outDir = os.path.abspath(os.path.join(self.data[0][6], os.path.pardir))
         workspaceDir = os.path.join(outDir, "tprScratch")
-        #-----------------------------------------------------------------------
-        def create_workspace_dir():
-            """
-            Description:
-            Creates workspace directory.
-            """
-            try:
-                os.mkdir(workspaceDir)
-            except OSError as oserror:
-                message = "Directory creation failed: {0}".format(oserror)
-                self.show_message(message, True)
-        #-----------------------------------------------------------------------
-        # if 'tprScratch' does not exists - just create it
-        if not os.path.exists(workspaceDir):
-            create_workspace_dir()
-        # if 'tprScratch' exists - delete it and create a new one
-        else:
+        # if 'tprScratch' exists - delete it
+        if os.path.exists(workspaceDir):
             shutil.rmtree(workspaceDir)
-            create_workspace_dir()
+        # create new one
+        if not self.inMemory:
+            self.create_workspace_dir(workspaceDir)
         # return workspaceDir
         return workspaceDir
 
+    def create_workspace_dir(self, workspaceDir):
+        """
+        Description:
+        Creates workspace directory.
+        """
+        try:
+            os.mkdir(workspaceDir)
+        except OSError as oserror:
+            message = "Directory creation failed: {0}".format(oserror)
+            self.show_message(message, True)
+
+    def set_arcpy_workspace(self, extent=None):
+        """
+        Description:
+        Sets arcpy workspace - 'in_memory' for memory workspace unless
+        rasters of the extent are bigger than spillSize, then intermediate
+        rasters spill to 'tprScratch'.
+
+        Arguments:
+        (tuple) extent:
+            - (xMin, yMin, xMax, yMax) processing extent
+            - default None - extent not known yet
+        """
+        if self.inMemory and extent is not None:
+            cells = ((extent[2] - extent[0]) / self.cellSize *
+                     (extent[3] - extent[1]) / self.cellSize)
+            if cells * 4 > self.spillSize:
+                self.inMemory = False
+                self.create_workspace_dir(self.workspace)
+                self.show_message("Memory workspace spilled to disk.")
+        if self.inMemory:
+            arcpy.env.workspace = "in_memory"
+        else:
+            arcpy.env.workspace = self.workspace
+            arcpy.env.scratchWorkspace = self.workspace
+
     def set_cellSize(self):
         """
         Description:
-        Sets processing cellSize.
+        Sets processing cellSize - the smallest texture cellSize, the user
+        cellSize for multiresolution compositing.
 
         Returns:
         (float) cellSize - processing cellSize
         """
+        if self.multiresolution:
+            return self.data[0][5]
         minCellSize = []
         for texture in self.textures:
             minCellSize.append(texture.cellSize)
@@ -689,6 +1408,63 @@ class Processor():
         else:
             return sorted(minCellSize)[0]
 
+    def set_engine(self, engine, seed=None):
+        """
+        Description:
+        Sets raster engine.
+
+        Arguments:
+        (string) engine:
+            - 'ArcPy', 'NumPy' or None
+
+        (integer) seed:
+            - NumPy engine random seed
+
+        Returns:
+        (Engine) engine - NumPy engine or None for arcpy processing
+        """
+        if engine is None:
+            engine = "ArcPy" if arcpy is not None else "NumPy"
+        if engine == "NumPy":
+            return tprengine.Engine(self.cellSize, seed)
+        elif engine == "ArcPy" and arcpy is not None:
+            return None
+        else:
+            raise ValueError("Engine '{0}' is not available.".format(engine))
+
+    def get_halo(self, dem=None):
+        """
+        Description:
+        Gets tiles overlap - the largest texture footprint + 1 cell for the
+        footprint rounding + 1 cell for the hillshade 3x3 kernel. With cast
+        shadows the overlap is extended by the longest possible shadow -
+        relief of the textured DEM over the light's slope, at most maxShadow
+        cells (low sun or high relief would make tiles read almost whole
+        DEM).
+
+        Arguments:
+        (Dem) dem:
+            - optional argument
+            - Dem object covering the processing extent
+
+        Returns:
+        (integer) halo - overlap in cells
+        """
+        footprint = max([t.footprint() for t in self.textures])
+        if dem is not None and dem.shadows and dem.alitude < 90:
+            terrain = tprengine.Statistics(dem.dem)
+            relief = (terrain.maximum - terrain.minimum + 2 *
+                      max([t.relief() for t in self.textures]))
+            shadow = (relief * dem.zfactor /
+                      math.tan(math.radians(dem.alitude)))
+            if self.maxShadow is not None and \
+               shadow > self.maxShadow * self.cellSize:
+                shadow = self.maxShadow * self.cellSize
+                self.show_message("Cast shadows longer than {0} cells are "
+                                  "cut at tile edges.".format(self.maxShadow))
+            footprint += shadow
+        return int(math.ceil(footprint / self.cellSize)) + 2
+
     def initialize_textures(self):
         """
         Description:
@@ -714,106 +1490,521 @@ class Processor():
         Returns:
         (raster) texture - texture raster
         """
-        # basic rasters - same for all pointbased textures
-        xmap = arcpy.sa.FlowAccumulation(
-               arcpy.sa.CreateConstantRaster(1,"INTEGER"))
-        ymap = arcpy.sa.FlowAccumulation(
-               arcpy.sa.CreateConstantRaster(64, "INTEGER"))
-        normalRaster = arcpy.sa.CreateNormalRaster()
-        # loop through referenced textures and create texture raster
+        self.prepare_textures()
         for texture in self.textures:
-            if isinstance(texture, PointBasedTexture):
-                texture.normalRaster = normalRaster #
-                texture.xmap = xmap                 #
-                texture.ymap = ymap                 # overriding
-            texture.cellSize = self.cellSize        #
-            texture.texture = texture.create()      #
+            if self.engine is not None:
+                texture.texture = self.engine.store(
+                                  self.create_texture_array(texture))
+            else:
+                # texture is processed within its area extent - points,
+                # stamps and arcpy rasters cover just the engine window
+                extent, engine = arcpy.env.extent, texture.engine
+                texture.engine = self.texture_window(texture, engine)
+                arcpy.env.extent = arcpy.Extent(*texture.engine.extent)
+                try:
+                    texture.texture = texture.create()
+                finally:
+                    arcpy.env.extent, texture.engine = extent, engine
+
+    def texture_window(self, texture, engine):
+        """
+        Description:
+        Gets arcpy processing window of the texture - extent of its
+        areaOfInterest + footprint, cropped by processing extent and
+        snapped to the processing grid (NumPy engine uses Engine.clip()
+        the same way, see Processor.clip_texture()).
+
+        Arguments:
+        (Texture) texture:
+            - referenced texture
+
+        (Engine) engine:
+            - processing grid set by Processor.prepare_textures()
+
+        Returns:
+        (Engine) window - texture processing window
+        """
+        if texture.__class__ == Texture:
+            return engine
+        area = arcpy.Describe(texture.areaOfInterest).extent
+        window = engine.clip((area.XMin, area.YMin, area.XMax, area.YMax),
+                             texture.footprint() + 2 * self.cellSize)
+        if window is None:
+            return engine
+        # windows of the same extent share lattice points
+        window.lattices = engine.lattices
+        return window
+
+    def prepare_textures(self):
+        """
+        Description:
+        Sets processing attributes (cellSize, engine) of
+        referenced textures.
+        """
+        # points are generated by the NumPy engine (Engine.lattice_points()),
+        # for arcpy processing too
+        if self.engine is not None:
+            lattice = self.engine
+        else:
+            extent = arcpy.env.extent
+            lattice = tprengine.Engine(self.cellSize, self.seed)
+            lattice.set_extent(extent.XMin, extent.YMin, extent.XMax,
+                               extent.YMax)
+        # loop through referenced textures and set attributes
+        for texture in self.textures:
+            texture.cellSize = self.texture_cellSize(texture)   # overriding
+            texture.engine = lattice                            #
 
-    def create_landuse(self):
+    def texture_cellSize(self, texture):
         """
         Description:
-        Merges textures ordered and reclassified by z-index.
-        Updates (overrides) property Texture.landuse so from now on it
-        refers to an actual raster reclassified by z-index.
+        Gets cellSize the texture is created at - its own cellSize for
+        multiresolution compositing, processing cellSize otherwise.
+
+        Arguments:
+        (Texture) texture:
+            - referenced texture
 
         Returns:
-        (raster) landuse - merged and ordered textures with z-index values
+        (float) cellSize - texture cellSize
         """
-        # reclass texture by it's z-index value to identify it later
-        for t in self.textures:
-            # prepare reclass params
-            inRaster = t.texture
-            reclassValue = t.zIndex
-            inMin = arcpy.GetRasterProperties_management(inRaster, "MINIMUM")
-            inMax = arcpy.GetRasterProperties_management(inRaster, "MAXIMUM")
-            remap = "{0} {1} {2}".format(inMin, inMax, reclassValue)
-            # reclass
-            t.landuse = arcpy.sa.Reclassify(inRaster, "Value", remap, "NODATA")
-            outRas = str("lnd" + arcpy.Describe(t.areaOfInterest).baseName)[:13]
-            t.landuse.save(outRas)
-        # merge textures together
+        # textures without own cellSize keep the dum number
+        if self.multiresolution and texture.cellSize != 9999.0:
+            return texture.cellSize
+        return self.cellSize
+
+    def create_texture_array(self, texture):
+        """
+        Description:
+        Creates texture array or takes it from the persistent cache. Cache
+        key covers texture fingerprint and processed extent (tile).
+
+        Arguments:
+        (Texture) texture:
+            - texture with engine set by Processor.prepare_textures()
+
+        Returns:
+        (SparseRaster) texture - texture raster
+        """
+        cache = self.engine.cache
+        if cache is None or texture.__class__ == Texture:
+            return self.clip_texture(texture)
+        key = tprcache.key(self.texture_fingerprint(texture),
+                           self.engine.extent, self.engine.shape)
+        cached = cache.get(key)
+        if cached is not None:
+            return tprengine.unpack(cached)
+        raster = self.clip_texture(texture)
+        cache.put(key, **raster.pack())
+        return raster
+
+    def clip_texture(self, texture):
+        """
+        Description:
+        Creates texture array within the bounding box of its areaOfInterest
+        data + footprint (no texture object reaches further), the array is
+        placed to the processed extent sparse raster by offset. Small areas
+        cost little on big DEMs. Texture of other cellSize (multiresolution)
+        is created on its own grid and resampled to the processed one.
+
+        Arguments:
+        (Texture) texture:
+            - texture with engine set by Processor.prepare_textures()
+
+        Returns:
+        (SparseRaster) texture - texture raster, NaN out of the bounding box
+        """
+        engine = self.engine
+        raster = tprengine.SparseRaster(engine.shape)
+        if texture.__class__ == Texture:
+            raster.insert(texture.create_array())
+            return raster
+        extent = engine.data_extent(texture.areaOfInterest, texture.dataType)
+        if extent is None:
+            return raster
+        window = engine.clip(extent, texture.footprint() + 2 * self.cellSize)
+        if window is None:
+            return raster
+        cellSize = float(texture.cellSize)
+        if cellSize == window.cellSize:
+            grid = window
+        else:
+            # blocks averaged by tprengine.resample_texture() are aligned
+            grid = window.rescale(cellSize, 2, max(int(window.cellSize /
+                                                       cellSize + 1e-9), 1))
+        texture.engine = grid
         try:
-            inRasters = ";".join([str(t.landuse) for t in sorted(self.textures,
-                        key=operator.attrgetter('zIndex'), reverse=True)])
-            landuse = arcpy.MosaicToNewRaster_management(inRasters,
-                      arcpy.env.workspace, "landuse","", "16_BIT_UNSIGNED",
-                      self.cellSize, 1, "First")
-            return landuse
-        except Exception as exception:
-            message = "Landuse creation failed - {0}.".format(exception)
-            self.show_message(message, True)
+            array = texture.create_array()
+        finally:
+            texture.engine = engine
+        if grid is not window:
+            array = tprengine.resample_texture(array, grid, window)
+        raster.insert(array, window.rowOffset - engine.rowOffset,
+                      window.colOffset - engine.colOffset)
+        return raster
+
+    def texture_fingerprint(self, texture):
+        """
+        Description:
+        Gets texture fingerprint - hash of areaOfInterest content, texture
+        class and parameters, cellSize and seed.
+
+        Arguments:
+        (Texture) texture:
+            - referenced texture
+
+        Returns:
+        (string) fingerprint
+        """
+        areaOfInterest = None
+        if texture.__class__ != Texture:
+            areaOfInterest = tprcache.file_hash(texture.areaOfInterest)
+        return tprcache.key("texture", texture.__class__.__name__,
+                            texture.parameters(), areaOfInterest,
+                            self.cellSize, self.texture_cellSize(texture),
+                            self.engine.seed)
+
+    def run_stage(self, name, fingerprint, create):
+        """
+        Description:
+        Runs pipeline stage unless it is up to date - results with the same
+        fingerprint are taken from the last run (Processor.stages) or from
+        the persistent cache.
+
+        Arguments:
+        (string) name:
+            - stage name, e.g. 'Hillshade'
+
+        (string) fingerprint:
+            - hash of the stage parameters and upstream stages fingerprints
+
+        (function) create:
+            - creates stage results - dictionary of arrays
 
-    def create_tpr(self, landuse, hillshadePer, hillshade):
+        Returns:
+        (dictionary) results - stage results
+        """
+        last = self.stages.get(name)
+        if last is not None and last[0] == fingerprint:
+            self.show_message("{0} unchanged.".format(name))
+            return last[1]
+        t1 = time.time()
+        # spilled arrays of the outdated results are deleted
+        if last is not None:
+            del self.stages[name]
+            self.delete_spilled(self.spilled_files(),
+                                self.spilled_files(last[1]))
+            last = None
+        results = None
+        if self.engine.cache is not None:
+            results = self.engine.cache.get(fingerprint)
+        if results is None:
+            results = create()
+            if self.engine.cache is not None:
+                self.engine.cache.put(fingerprint, **results)
+        self.stages[name] = (fingerprint, results)
+        self.show_message("Duration: {0} | {1} OK.".format(
+                          timedelta(seconds=round(time.time()-t1)), name))
+        return results
+
+    def read_terrain(self):
+        """
+        Description:
+        Reads terrain by the NumPy engine as pipeline stage. Tiled execution
+        gets lazy terrain - tiles read just their windows.
+
+        Returns:
+        (tuple) (fingerprint, terrain) - DEM stage fingerprint and Grid
+        """
+        sourceFile = self.data[0][0]
+        terrainType = tprio.data_type(sourceFile)
+        fingerprint = tprcache.key("dem", tprcache.file_hash(sourceFile),
+                                   terrainType, self.cellSize)
+        if self.tileSize is not None:
+            return fingerprint, self.engine.read_terrain(sourceFile,
+                                                         terrainType)
+        def create():
+            grid = self.engine.read_terrain(sourceFile, terrainType)
+            return {"array": grid.array, "origin": numpy.array([grid.xMin,
+                    grid.yMax, grid.cellSize])}
+        results = self.run_stage("DEM", fingerprint, create)
+        return fingerprint, tprio.Grid(results["array"], *results["origin"])
+
+    def create_staged_tpr(self, dem, demFingerprint):
+        """
+        Description:
+        Creates TPR by pipeline stages (NumPy engine):
+            DEM -> textures -> bumpmap (+ landuse) -> hillshade -> TPR
+        Stages fingerprints are made of their parameters and upstream
+        fingerprints, up to date stages are not run again (see
+        Processor.run_stage()), so color change reruns just TPR compositing,
+        hillshade change reruns hillshade and compositing and a texture
+        change rebuilds that texture and downstream stages.
+
+        Arguments:
+        (Dem) dem:
+            - Dem object covering the processing extent
+
+        (string) demFingerprint:
+            - DEM stage fingerprint by Processor.read_terrain()
+        """
+        # fingerprints
+        texturePrints = [tprcache.key(self.texture_fingerprint(t),
+                         demFingerprint) for t in self.textures]
+        bumpmapPrint = tprcache.key("bumpmap", demFingerprint,
+                       [(f, t.zIndex) for f, t in zip(texturePrints,
+                        self.textures)])
+        hillshadePrint = tprcache.key("hillshade", bumpmapPrint, dem.azimuth,
+                         dem.alitude, dem.zfactor, dem.shadows)
+        # textures added to DEM, landuse
+        def create_bumpmap():
+            self.prepare_textures()
+            # stages named by texture row too - zIndex may be shared
+            for i, (t, fingerprint) in enumerate(zip(self.textures,
+                                                     texturePrints)):
+                create = lambda: self.engine.store(
+                                 self.clip_texture(t)).pack()
+                t.texture = tprengine.unpack(self.run_stage(
+                            "Texture {0} ({1})".format(t.zIndex, i + 1),
+                            fingerprint, create))
+            texturedDEM = dem.add_textures(self.textures)
+            for t in self.textures:
+                t.texture = None
+            return {"texturedDEM": texturedDEM, "landuse": dem.landuse}
+        bumpmap = self.run_stage("Bumpmap", bumpmapPrint, create_bumpmap)
+        # hillshade
+        def create_hillshade():
+            return {"hsPer": dem.hillshade_to_percent(bumpmap["texturedDEM"])}
+        hsPer = self.run_stage("Hillshade", hillshadePrint,
+                               create_hillshade)["hsPer"]
+        # tpr - always created (colors and output)
+        t1 = time.time()
+        self.create_tpr(bumpmap["landuse"], hsPer)
+        self.show_message("Duration: {0} | TPR OK.".format(
+                          timedelta(seconds=round(time.time()-t1))))
+
+    def create_variants(self, lights, multidirectional=False):
+        """
+        Description:
+        Creates TPRs for several light sources from the last bumpmap (NumPy
+        engine, after Processor.main()), terrain gradients are computed just
+        once. Outputs are named <output>_<azimuth>_<altitude>.<extension>.
+
+        Arguments:
+        (list) lights:
+            - (azimuth, altitude) pairs
+
+        (boolean) multidirectional:
+            - True - one TPR shaded by mean of all light sources (output
+              named <output>_multi.<extension>)
+            - default False - comparison TPR for each light source
+
+        Returns:
+        (list) outputs - paths to created TPRs
+        """
+        if "Bumpmap" not in self.stages or self.tileSize is not None:
+            raise ValueError("Variants need bumpmap of untiled NumPy engine "
+                             "run (Processor.main()).")
+        bumpmap = self.stages["Bumpmap"][1]
+        hsPers = self.engine.hillshade_batch(bumpmap["texturedDEM"], lights,
+                 self.data[0][3], self.data[0][4] == "Yes")
+        base, extension = os.path.splitext(self.output)
+        if multidirectional:
+            hsPers = [numpy.floor(sum(hsPers) / len(hsPers) * 255) / 255]
+            names = ["multi"]
+        else:
+            names = ["{0}_{1}".format(azimuth, altitude) for azimuth, altitude
+                     in lights]
+        outputs = []
+        for name, hsPer in zip(names, hsPers):
+            output = "{0}_{1}{2}".format(base, name, extension)
+            self.engine.write_rgb(output, self.create_rgb(bumpmap["landuse"],
+                                  hsPer), self.compression,
+                                  *self.spatialReference,
+                                  overviews=self.overviews)
+            outputs.append(output)
+        return outputs
+
+    def create_tpr(self, landuse, hillshadePer):
         """
         Description:
         Creates TPR raster (RGB composite).
 
         Arguments:
-        (raster) landuse:
-            - landuse raster by Processor.create_landuse()
+        (numpy array/raster) landuse:
+            - Dem.landuse by Dem.add_textures()
 
-        (raster) hillshadePer:
+        (numpy array/raster) hillshadePer:
             - raster by Dem.hillshade_to_percent()
 
-        (raster) hillshade:
-            - raster referenced by Dem.hillshade property
-
         Returns:
         (raster) tpr - final Textured Painted Relief
+
+        Note:
+        arcpy rasters are composited by BLOCK rows strips, TIFF output is
+        streamed, so no full extent array is read.
         """
-        r = []
-        g = []
-        b = []
-        colors = []
-        # get values for each color and each z-index----------------------------
-        for t in self.textures:
-            for color in t.colors:
-                remapValue = "{0} {1}".format(t.zIndex, t.colors[color])
-                if color == "r":
-                    r.append(remapValue)
-                elif color == "g":
-                    g.append(remapValue)
-                elif color == "b":
-                    b.append(remapValue)
-        colors.extend([r, g, b])
-        # prepare r, g, b components--------------------------------------------
-        for color in colors:
-            # prepare reclass params
-            inRaster =  landuse
-            reclassField = "Value"
-            remap = ";".join([c for c in color])
-            # reclass by color and multiply by hillshadePercent to get
-            # appropriate color change
-            colorEdited = arcpy.sa.Int(arcpy.sa.Reclassify(inRaster,
-                          reclassField, remap, "NODATA") * hillshadePer)
-            # merge together with hillshade and append to color list
-            color.append(arcpy.sa.Con(arcpy.sa.IsNull(colorEdited),
-                                      hillshade, colorEdited))
-        # tpr = RGB composite---------------------------------------------------
-        inRasters = ";".join([str(color[-1]) for color in colors])
+        # NumPy engine
+        if self.engine is not None:
+            rgb = self.create_rgb(landuse, hillshadePer)
+            try:
+                self.engine.write_rgb(self.output, rgb, self.compression,
+                                      *self.spatialReference,
+                                      overviews=self.overviews)
+            except Exception as exception:
+                message = "Textured painted relief error - {0}.".format(
+                          exception)
+                self.show_message(message, True)
+            return
+        # processing grid (set by create_textures())-------------------------
+        grid = self.textures[0].engine
+        tif = rgb = None
         try:
+            if os.path.splitext(self.output)[1].lower() in (".tif", ".tiff"):
+                epsg, geographic, wkt = self.spatialReference
+                tif = tprio.TiffWriter(self.output, grid.rows, grid.cols,
+                      grid.xMin, grid.yMax, grid.cellSize, self.compression,
+                      epsg=epsg, geographic=geographic, wkt=wkt,
+                      overviews=self.overviews)
+            else:
+                rgb = numpy.zeros(grid.shape + (3,), numpy.uint8)
+            # tpr = RGB composite by strips-----------------------------------
+            for row in range(0, grid.rows, tprengine.BLOCK):
+                strip = grid.window(row, 0, min(tprengine.BLOCK,
+                                    grid.rows - row), grid.cols)
+                stripLanduse = strip.read_array(landuse)
+                stripLanduse = numpy.where(numpy.isnan(stripLanduse),
+                               tprengine.NODATA, stripLanduse).astype(
+                               numpy.int32)
+                stripRgb = self.create_rgb(stripLanduse,
+                                           strip.read_array(hillshadePer))
+                if tif is not None:
+                    tif.write(row, 0, stripRgb)
+                else:
+                    rgb[row:row + strip.rows] = stripRgb
+            if tif is not None:
+                tif.close()
+            else:
+                tprio.write_rgb(self.output, rgb, grid.xMin, grid.yMax,
+                                self.cellSize, self.compression,
+                                *self.spatialReference,
+                                overviews=self.overviews)
             arcpy.env.addOutputsToMap = True
-            tpr = arcpy.CompositeBands_management(inRasters, self.output)
+            arcpy.MakeRasterLayer_management(self.output,
+                os.path.splitext(os.path.basename(self.output))[0])
+        except Exception as exception:
+            message = "Textured painted relief error - {0}.".format(exception)
+            self.show_message(message, True)
+
+    def create_rgb(self, landuse, hillshadePer):
+        """
+        Description:
+        Creates RGB composite from arrays - single pass over landuse and
+        hillshade using z-index -> RGB lookup table.
+
+        Arguments:
+        (numpy array) landuse, hillshadePer:
+            - see Processor.create_tpr()
+
+        Returns:
+        (numpy array) rgb - uint8 array of (rows, cols, 3) shape
+        """
+        colors = {}
+        for t in self.textures:
+            colors[t.zIndex] = [t.colors[color] for color in ["r", "g", "b"]]
+        rgb = tprengine.composite(landuse, colors, hillshadePer)
+        return rgb
+
+    def render_tile(self, dem, window):
+        """
+        Description:
+        Runs whole processing for one tile.
+
+        Arguments:
+        (Dem) dem:
+            - Dem object covering the processing extent
+
+        (tuple) window:
+            - tile window (row, col, rows, cols) by Engine.tiles()
+
+        Returns:
+        (numpy array) rgb - tile RGB composite (including halo)
+        """
+        # processor and Dem for the tile, textures are shared
+        tile = copy.copy(self)
+        tile.engine = self.engine.window(*window)
+        tileDem = dem.window(tile.engine)
+        tile.create_textures()
+        texturedDEM = tileDem.add_textures(tile.textures)
+        hsPer = tileDem.hillshade_to_percent(texturedDEM)
+        return tile.create_rgb(tileDem.landuse, hsPer)
+
+    def create_tiled_tpr(self, dem):
+        """
+        Description:
+        Creates TPR tile by tile (tiled execution mode). Tiles are rendered
+        with overlap (Processor.get_halo()) and only their cores are stitched
+        together, so memory used by textures is bounded by tile size. TIFF
+        output is streamed to the file as tiles are done, other formats are
+        stitched in memory.
+
+        Arguments:
+        (Dem) dem:
+            - Dem object covering the processing extent
+        """
+        tiles = self.engine.tiles(self.tileSize, self.get_halo(dem))
+        jobs = [(i, window, core) for i, (window, core, target) in
+                enumerate(tiles)]
+        tif = rgb = None
+        if os.path.splitext(self.output)[1].lower() in (".tif", ".tiff"):
+            epsg, geographic, wkt = self.spatialReference
+            tif = tprio.TiffWriter(self.output, self.engine.rows,
+                  self.engine.cols, self.engine.xMin, self.engine.yMax,
+                  self.engine.cellSize, self.compression, epsg=epsg,
+                  geographic=geographic, wkt=wkt, overviews=self.overviews)
+        else:
+            rgb = numpy.zeros(self.engine.shape + (3,), numpy.uint8)
+        # open areas of interest just once - workers get them with Processor
+        # (ShapeFile geometry, memory-mapped rasters references)
+        for t in self.textures:
+            if t.__class__ != Texture:
+                self.engine.read_grid(t.areaOfInterest, t.dataType)
+        # render tiles - in worker processes or one by one
+        pool = None
+        if self.workers > 1:
+            # ArcMap can't be used to start worker processes
+            if not sys.executable.lower().endswith("python.exe") and \
+               os.name == "nt":
+                multiprocessing.set_executable(os.path.join(sys.exec_prefix,
+                                               "pythonw.exe"))
+            pool = multiprocessing.Pool(self.workers, init_worker,
+                                        (self, dem))
+            results = pool.imap_unordered(render_tile_job, jobs)
+        else:
+            results = (render_tile_job(job, self, dem) for job in jobs)
+        # stitch tiles as they are done
+        try:
+            for done, (i, tileRgb) in enumerate(results):
+                target = tiles[i][2]
+                if tif is not None:
+                    tif.write(target[0].start, target[1].start, tileRgb)
+                else:
+                    rgb[target] = tileRgb
+                self.show_message("Tile {0}/{1} OK.".format(done + 1,
+                                  len(tiles)))
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+        # free texture arrays of the last tile
+        for t in self.textures:
+            t.texture = None
+        try:
+            if tif is not None:
+                tif.close()
+            else:
+                self.engine.write_rgb(self.output, rgb, None,
+                                      *self.spatialReference)
         except Exception as exception:
             message = "Textured painted relief error - {0}.".format(exception)
             self.show_message(message, True)
@@ -829,9 +2020,9 @@ class Processor():
             - determines if just print the message or use sys.exit()
 
         Used in:
-        prepare_workspace(), create_landuse(), create_tpr(), main()
+        prepare_workspace(), create_tpr(), main()
         """
-        if __name__ == "__main__":
+        if __name__ == "__main__" or pub is None:
             if terminate == True:
                 sys.exit(message)
             else:
@@ -844,45 +2035,83 @@ class Processor():
         Description:
         Deletes temporary rasters and workspace directory.
         """
+        # free textures, delete spilled arrays except stages results (kept
+        # for the next run, see Processor.run_stage())
+        for t in self.textures:
+            t.texture = None
+        self.delete_spilled(self.spilled_files())
         # get rasters to delete
         toDel = []
-        for outRaster in arcpy.ListFiles():
-            if str(arcpy.Describe(outRaster).dataType) == "RasterDataset":
-                toDel.append(outRaster)
+        if arcpy is not None and arcpy.env.workspace == self.workspace:
+            for outRaster in arcpy.ListFiles():
+                if str(arcpy.Describe(outRaster).dataType) == "RasterDataset":
+                    toDel.append(outRaster)
+        elif arcpy is not None:
+            toDel.append("in_memory")
         # delete rasters
         for delRaster in toDel:
             arcpy.Delete_management(delRaster)
         # delete scratch folder
-        shutil.rmtree(self.workspace)
+        if os.path.exists(self.workspace):
+            shutil.rmtree(self.workspace)
 
     def main(self):
         """
         Description:
         Main processing method. Implements tool logic.
         """
+        t0 = time.time()
+        extensions = []
+        dem = textures = texturedDEM = hsper = tpr = None
         try:
-            extensions = ["Spatial","3D"]
+            # arcpy is used by NumPy engine too (TIN and ShapeFile conversion)
+            if arcpy is not None:
+                extensions = ["Spatial","3D"]
             for extension in extensions:
                 if arcpy.CheckExtension(extension) == "Available":
                     arcpy.CheckOutExtension(extension)
             #-------------------------------------------------------------------
             # Preparations
             #-------------------------------------------------------------------
-            t0 = time.time()
             self.show_message("Starting processing!")
             # basic environments
-            arcpy.env.addOutputsToMap = False
-            arcpy.env.overwriteOutput = True
-            arcpy.env.cellSize = self.cellSize
-            arcpy.env.workspace = self.workspace
-            arcpy.env.scratchWorkspace = self.workspace
+            if arcpy is not None:
+                arcpy.env.addOutputsToMap = False
+                arcpy.env.overwriteOutput = True
+                arcpy.env.cellSize = self.cellSize
+                self.set_arcpy_workspace()
             # create Dem object, set working extent
+            terrain = demFingerprint = None
+            if self.engine is not None:
+                demFingerprint, terrain = self.read_terrain()
             dem = Dem(self.data[0][0], self.data[0][1], self.data[0][2],
-                      self.data[0][3], self.data[0][4], self.cellSize)
-            arcpy.env.extent = dem.extent
+                      self.data[0][3], self.data[0][4], self.cellSize,
+                      self.engine, terrain)
+            self.spatialReference = tprio.spatial_reference(self.data[0][0])
+            if self.engine is None:
+                arcpy.env.extent = dem.extent
+                self.set_arcpy_workspace((dem.extent.XMin, dem.extent.YMin,
+                                          dem.extent.XMax, dem.extent.YMax))
+            else:
+                self.engine.set_reference(dem.dem)
+                if arcpy is not None:
+                    arcpy.env.extent = arcpy.Extent(*dem.extent)
             #-------------------------------------------------------------------
             # Processing
             #-------------------------------------------------------------------
+            # tiled execution - all steps are done tile by tile
+            if self.tileSize is not None:
+                t1 = time.time()
+                tpr = self.create_tiled_tpr(dem)
+                self.show_message("Duration: {0} | TPR OK.".format(
+                                  timedelta(seconds=round(time.time()-t1))))
+                self.show_message("Processing finished!")
+                return
+            # NumPy engine - only stages affected by changes are run
+            if self.engine is not None:
+                self.create_staged_tpr(dem, demFingerprint)
+                self.show_message("Processing finished!")
+                return
             # create and add textures to DEM
             t1 = time.time()
             textures = self.create_textures()
@@ -897,22 +2126,18 @@ class Processor():
             hsper = dem.hillshade_to_percent(texturedDEM)
             self.show_message("Duration: {0} | Hillshade OK.".format(
                               timedelta(seconds=round(time.time()-t1))))
-            # create landuse
-            t1 = time.time()
-            landuse = self.create_landuse()
-            self.show_message("Duration: {0} | Landuse OK.".format(
-                              timedelta(seconds=round(time.time()-t1))))
             # create tpr
             t1 = time.time()
-            tpr = self.create_tpr(landuse, hsper, dem.hillshade)
+            tpr = self.create_tpr(dem.landuse, hsper)
             self.show_message("Duration: {0} | TPR OK.".format(
                               timedelta(seconds=round(time.time()-t1))))
             self.show_message("Processing finished!")
             #-------------------------------------------------------------------
         except Exception as exception:
-            self.show_message(arcpy.GetMessage(0))
-            self.show_message(arcpy.GetMessage(1))
-            self.show_message(arcpy.GetMessage(2))
+            if arcpy is not None:
+                self.show_message(arcpy.GetMessage(0))
+                self.show_message(arcpy.GetMessage(1))
+                self.show_message(arcpy.GetMessage(2))
             self.show_message(str(exception))
         finally:
             # return extensions
@@ -922,9 +2147,47 @@ class Processor():
             self.show_message("Total duration: {0}.".format(
                                timedelta(seconds=round(time.time()-t0))))
             # cleanup - remove objects (to loose locks) and files
-            del dem, textures, texturedDEM, hsper, landuse, tpr
+            del dem, textures, texturedDEM, hsper, tpr
             self.cleanup()
 #-------------------------------------------------------------------------------
+workerData = None   # (Processor, Dem) of the worker process; by init_worker()
+
+def init_worker(processor, dem):
+    """
+    Description:
+    Worker process initializer - keeps Processor and Dem objects in the worker,
+    so they are sent to each worker process just once.
+
+    Arguments:
+    (Processor) processor, (Dem) dem:
+        - objects covering the processing extent
+    """
+    global workerData
+    workerData = (processor, dem)
+
+
+def render_tile_job(job, processor=None, dem=None):
+    """
+    Description:
+    Renders one tile - job of Processor.create_tiled_tpr().
+    Random rasters are hashed from the grid position (Engine.cell_hashes()),
+    so output doesn't depend on number of workers or on tiles order.
+
+    Arguments:
+    (tuple) job:
+        - (index, window, core) - tile index and slices by Engine.tiles()
+
+    (Processor) processor, (Dem) dem:
+        - default None - objects set by init_worker() are used
+
+    Returns:
+    (tuple) (index, rgb) - tile index and RGB composite of the tile core
+    """
+    if processor is None:
+        processor, dem = workerData
+    index, window, core = job
+    return index, processor.render_tile(dem, window)[core]
+#-------------------------------------------------------------------------------
 #-------------------------------------------------------------------------------
 # Uncomment code below and change data definition to run as standalone script
 ##if __name__ == "__main__":
@@ -932,5 +2195,18 @@ class Processor():
 ##            [[u'D:\\someData1', 800, {'r': 0, 'b': 255, 'g': 0}, 'Squares', 2, 20, 10, 40],
 ##             [u'D:\\someData2', 600, {'r': 255, 'b': 0, 'g': 0}, 'Cones', 5, 20, 20, 30]]
 ##           ]
-##    processor = Processor(data)
+##    processor = Processor(data)   # or Processor(data, engine="NumPy")
+##                                  # or Processor(data, "NumPy", tileSize=2048,
+##                                  #              workers=4)
+##                                  # or Processor(data, workspace="Memory")
+##                                  # or Processor(data, "NumPy", seed=1,
+##                                  #              cache="D:\\tprCache")
+##    processor.main()
+##    # change colors, hillshade or textures and render again - just stages
+##    # affected by the change are run (NumPy engine)
+##    data[1][0][2] = {'r': 0, 'b': 128, 'g': 0}
+##    processor.update(data)
+##    processor.main()
+##    # comparison renders for several light sources (NumPy engine)
+##    processor.create_variants([(270, 45), (315, 45), (360, 30)])
 ##    processor.main()
\ No newline at end of file